@@ -50,3 +50,17 @@ imp = solvebio.DatasetImport.create(
     data_records=new_records
 )
 dataset.activity(follow=True)
+
+
+# Records can also be generated and imported in chunks,
+# without holding them all in memory at once.
+def generate_records():
+    for i in range(100000):
+        yield {
+            'gene_symbol': 'GENE{0}'.format(i),
+            'some_new_field': 'generated'
+        }
+
+
+solvebio.Dataset(dataset.dataset_id).import_records(
+    generate_records(), chunk_size=1000)
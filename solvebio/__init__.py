@@ -115,6 +115,7 @@ from .resource import (
     SavedQuery,
     Task
 )
+from .resource.taskmonitor import TaskMonitor
 
 
 def login(**kwargs):
@@ -192,6 +193,7 @@ __all__ = [
     'SolveError',
     'VaultSyncTask',
     'Task',
+    'TaskMonitor',
     'Vault',
     'User',
     'VERSION'
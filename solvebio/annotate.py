@@ -2,11 +2,153 @@
 from __future__ import absolute_import
 
 from .client import client
+from .utils.concurrency import imap_ordered
+from .utils.jsonutils import json_default
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
 
 import logging
 logger = logging.getLogger('solvebio')
 
 
+class AdaptiveChunkSize(object):
+    """
+    Adjusts the Annotator chunk size, within limits, to target
+    a request latency and a response size.
+
+    After each request, the ideal chunk size is estimated from the
+    measured time and response size per record. The chunk size moves
+    towards it, at most doubling or halving at each step.
+
+    Each measurement is recorded in `history` as a tuple of
+    (chunk_size, seconds, response_bytes).
+    """
+
+    def __init__(self, initial=None, min_size=10, max_size=500,
+                 target_seconds=2.0, target_bytes=2 * 1024 * 1024):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.history = []
+        self._lock = threading.Lock()
+        self.set_size(initial or Annotator.CHUNK_SIZE)
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(self.max_size, size)))
+
+    def __call__(self):
+        return self.size
+
+    def set_size(self, size):
+        self.size = self._clamp(size)
+
+    @property
+    def sizes(self):
+        """The chunk sizes used so far."""
+        return [h[0] for h in self.history]
+
+    def update(self, chunk_size, seconds, response_bytes):
+        ratios = []
+        if seconds > 0:
+            ratios.append(self.target_seconds / float(seconds))
+        if response_bytes > 0:
+            ratios.append(self.target_bytes / float(response_bytes))
+
+        with self._lock:
+            self.history.append((chunk_size, seconds, response_bytes))
+            if ratios:
+                ideal = chunk_size * min(ratios)
+                self.size = self._clamp(
+                    min(max(ideal, self.size / 2.0), self.size * 2.0))
+
+        logger.debug('annotate chunk of %d took %.2fs (%d bytes), '
+                     'next chunk size: %d'
+                     % (chunk_size, seconds, response_bytes, self.size))
+
+
+class AnnotationCache(object):
+    """
+    A least-recently-used cache of annotated records, keyed by a stable
+    hash of the input record, the fields and the annotator parameters.
+
+    Results are kept in memory (up to `max_size` records) and,
+    if a `path` is provided, also stored in a SQLite database
+    so that they can be reused across processes and sessions.
+    """
+
+    def __init__(self, max_size=100000, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS annotations '
+                             '(key TEXT PRIMARY KEY, value TEXT)')
+            self._db.commit()
+
+    @staticmethod
+    def make_key(record, fields, annotator_params=None, data=None):
+        payload = json.dumps([record, fields, annotator_params, data],
+                             sort_keys=True, separators=(',', ':'),
+                             default=json_default)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns a copy of the cached result, or None."""
+        with self._lock:
+            value = self._lru.pop(key, None)
+            if value is None and self._db is not None:
+                row = self._db.execute(
+                    'SELECT value FROM annotations WHERE key = ?',
+                    (key,)).fetchone()
+                value = row[0] if row else None
+
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._store(key, value)
+
+        return json.loads(value)
+
+    def set_many(self, items):
+        """Caches a list of (key, result) pairs."""
+        items = [(k, json.dumps(v)) for k, v in items]
+        with self._lock:
+            for key, value in items:
+                self._store(key, value)
+            if self._db is not None and items:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO annotations VALUES (?, ?)',
+                    items)
+                self._db.commit()
+
+    def _store(self, key, value):
+        self._lru[key] = value
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def __len__(self):
+        return len(self._lru)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
 class Annotator(object):
     """
     Runs the synchronous annotate endpoint against
@@ -22,6 +164,20 @@ class Annotator(object):
 
         self.buffer = []
         self.fields = fields
+        # Number of chunks annotated concurrently (1 is sequential)
+        self.concurrency = kwargs.pop('concurrency', 1)
+        # Pass adaptive=True (or an AdaptiveChunkSize) to adjust
+        # the chunk size based on request latency and response size.
+        adaptive = kwargs.pop('adaptive', None)
+        if adaptive is True:
+            adaptive = AdaptiveChunkSize()
+        self.adaptive = adaptive or None
+        # Pass cache=True (or an AnnotationCache) to only send
+        # records that have not already been annotated.
+        cache = kwargs.pop('cache', None)
+        if cache is True:
+            cache = AnnotationCache()
+        self.cache = cache if cache is not False else None
 
         # Pop annotator_params from kwargs
         annotator_param_keys = [
@@ -39,6 +195,13 @@ class Annotator(object):
     def annotate(self, records, **kwargs):
         """Annotate a set of records with stored fields.
 
+        When the Annotator was created with `concurrency` > 1, up to that
+        many chunks are annotated at once while the input records
+        are still being read. Records are always yielded in input order.
+
+        When the Annotator was created with `adaptive`, `chunk_size`
+        is only used for the first chunk.
+
         Args:
             records: A list or iterator (can be a Query object)
             chunk_size: The number of records to annotate at once (max 500).
@@ -49,30 +212,95 @@ class Annotator(object):
         # Update annotator_params with any kwargs
         self.annotator_params.update(**kwargs)
         chunk_size = self.annotator_params.get('chunk_size', self.CHUNK_SIZE)
+        if self.adaptive:
+            if 'chunk_size' in self.annotator_params:
+                self.adaptive.set_size(chunk_size)
+            chunk_size = self.adaptive
+
+        results = imap_ordered(lambda chunk: list(self._execute(chunk)),
+                               self._chunks(records, chunk_size),
+                               workers=self.concurrency,
+                               max_pending=self.concurrency)
+        for chunk_results in results:
+            for r in chunk_results:
+                yield r
+
+    @staticmethod
+    def _chunks(records, chunk_size):
+        """
+        Splits records into chunks. The chunk size
+        can be a number or a function returning one.
+        """
+        get_size = chunk_size if callable(chunk_size) else lambda: chunk_size
 
         chunk = []
-        for i, record in enumerate(records):
+        size = get_size()
+        for record in records:
             chunk.append(record)
-            if (i + 1) % chunk_size == 0:
-                for r in self._execute(chunk):
-                    yield r
+            if len(chunk) >= size:
+                yield chunk
                 chunk = []
+                size = get_size()
 
         if chunk:
-            for r in self._execute(chunk):
-                yield r
-            chunk = []
+            yield chunk
 
     def _execute(self, chunk):
+        if self.cache is None:
+            for r in self._post(chunk):
+                yield r
+            return
+
+        # The chunk_size does not change annotation results
+        params = dict((k, v) for k, v in self.annotator_params.items()
+                      if k != 'chunk_size')
+        keys = [self.cache.make_key(record, self.fields, params, self.data)
+                for record in chunk]
+
+        # Only send cache misses, without duplicates
+        results = {}
+        misses = OrderedDict()
+        for key, record in zip(keys, chunk):
+            if key in results or key in misses:
+                continue
+            result = self.cache.get(key)
+            if result is None:
+                misses[key] = record
+            else:
+                results[key] = result
+
+        if misses:
+            annotated = list(zip(misses, self._post(list(misses.values()))))
+            self.cache.set_many(annotated)
+            results.update(annotated)
+
+        seen = set()
+        for key in keys:
+            # Duplicate records in a chunk get their own copy
+            if key in seen:
+                yield json.loads(json.dumps(results[key]))
+            else:
+                seen.add(key)
+                yield results[key]
+
+    def _post(self, records):
         data = {
-            'records': chunk,
+            'records': records,
             'fields': self.fields,
             'annotator_params': self.annotator_params,
             'data': self.data
         }
 
-        for r in self._client.post('/v1/annotate', data)['results']:
-            yield r
+        if not self.adaptive:
+            return self._client.post('/v1/annotate', data)['results']
+
+        # Measure the request time and response size
+        start = time.time()
+        response = self._client.post('/v1/annotate', data, raw=True)
+        results = response.json()['results']
+        self.adaptive.update(len(records), time.time() - start,
+                             len(response.content))
+        return results
 
 
 class Expression(object):
@@ -81,6 +309,9 @@ class Expression(object):
     # Allows pre-setting a SolveClient
     _client = None
 
+    # Name of the field used to evaluate expressions in batches
+    EVALUATE_FIELD = '_expression_result'
+
     def __init__(self, expr, **kwargs):
         self.expr = expr
         self._client = kwargs.get('client') or self._client or client
@@ -96,5 +327,34 @@ class Expression(object):
         res = self._client.post('/v1/evaluate', payload)
         return res['result']
 
+    def evaluate_many(self, records, data_type='string', is_list=False,
+                      chunk_size=Annotator.CHUNK_SIZE, concurrency=1,
+                      memoize=False):
+        """
+        Evaluates the expression against many records, in batches.
+
+        Each record (a dict) is available in the expression as `record`,
+        like `evaluate(data={'record': record})`. Records are sent in
+        chunks through the annotate endpoint, optionally concurrently.
+        Set `memoize` to True (or to an AnnotationCache) to only evaluate
+        each distinct record once.
+
+        Returns:
+            A generator that yields one result per record, in order.
+        """
+        field = {
+            'name': self.EVALUATE_FIELD,
+            'expression': self.expr,
+            'data_type': data_type,
+            'is_list': is_list
+        }
+        annotator = Annotator([field],
+                              client=self._client,
+                              concurrency=concurrency,
+                              cache=memoize)
+
+        for r in annotator.annotate(records, chunk_size=chunk_size):
+            yield r.get(self.EVALUATE_FIELD)
+
     def __repr__(self):
         return '<Expression "{0}">'.format(self.expr)
@@ -432,16 +432,18 @@ def import_file(args):
                 print(file_)
         return
 
-    # Generate a manifest from the local files
-    imports = []
-    for file_ in files_list:
-        if args.remote_source:
-            kwargs = dict(object_id=file_.id)
-        else:
-            manifest = solvebio.Manifest()
-            manifest.add(file_)
-            kwargs = dict(manifest=manifest.manifest)
+    if args.remote_source:
+        sources = [dict(object_id=file_.id) for file_ in files_list]
+    else:
+        # Upload all the local files concurrently,
+        # and import each file separately.
+        manifest = solvebio.Manifest()
+        manifest.add(*files_list)
+        sources = [dict(manifest={'files': [entry]})
+                   for entry in manifest.manifest['files']]
 
+    imports = []
+    for kwargs in sources:
         # Add template params
         if template:
             kwargs.update(template.import_params)
@@ -456,7 +458,7 @@ def import_file(args):
         imports.append(import_)
 
     if args.follow:
-        dataset.activity(follow=True)
+        solvebio.TaskMonitor(imports).wait()
     else:
         mesh_url = 'https://my.solvebio.com/activity/'
         print("Your import has been submitted, view details at: {0}"
@@ -9,6 +9,7 @@ import solvebio
 
 from .version import VERSION
 from .errors import SolveError
+from .utils.jsonutils import json_default
 from .utils.validators import validate_api_host_url
 
 import platform
@@ -238,7 +239,7 @@ class SolveClient(object):
             # Don't use application/json for file uploads or GET requests
             opts['headers'].pop('Content-Type', None)
         else:
-            opts['data'] = json.dumps(opts['data'])
+            opts['data'] = json.dumps(opts['data'], default=json_default)
 
         if not url.startswith(self._host):
             url = urljoin(self._host, url)
@@ -257,7 +258,7 @@ class SolveClient(object):
             delay = int(response.headers['retry-after']) + 1
             logger.warn('Too many requests. Retrying in {0}s.'.format(delay))
             time.sleep(delay)
-            return self.request(method, url, **kwargs)
+            return self.request(method, url, raw=raw, debug=debug, **kwargs)
 
         if not (200 <= response.status_code < 400):
             _handle_api_error(response)
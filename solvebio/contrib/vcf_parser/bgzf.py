@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal helpers to read BGZF-compressed files (i.e. files compressed
+with bgzip) block by block, and their tabix (.tbi) indexes.
+
+BGZF files are a series of gzip members ("blocks") of up to 64KB of
+uncompressed data. Positions in a BGZF file are "virtual offsets":
+the file offset of a block shifted left by 16 bits, plus the offset
+within the uncompressed block.
+"""
+from __future__ import absolute_import
+
+import gzip
+import os
+import struct
+import zlib
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+
+_HEADER = struct.Struct('<4sI2BH')
+_SUBFIELD = struct.Struct('<2sH')
+
+
+def make_virtual_offset(block_offset, within_block):
+    return (block_offset << 16) | within_block
+
+
+def split_virtual_offset(virtual_offset):
+    return virtual_offset >> 16, virtual_offset & 0xFFFF
+
+
+def _read_block_size(f):
+    """
+    Reads a BGZF block header at the current position of `f` and
+    returns the total size of the block, or None at the end of the file.
+    """
+    header = f.read(_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size or header[:4] != BGZF_MAGIC:
+        raise ValueError('Invalid BGZF block in {0}'.format(f.name))
+
+    extra_len = _HEADER.unpack(header)[4]
+    extra = f.read(extra_len)
+    i = 0
+    while i < extra_len:
+        tag, length = _SUBFIELD.unpack_from(extra, i)
+        if tag == b'BC':
+            return struct.unpack_from('<H', extra, i + 4)[0] + 1
+        i += 4 + length
+
+    raise ValueError('Invalid BGZF block in {0}'.format(f.name))
+
+
+def read_block(f):
+    """
+    Reads and decompresses the BGZF block at the current position
+    of `f`. Returns None at the end of the file.
+    """
+    offset = f.tell()
+    block_size = _read_block_size(f)
+    if block_size is None:
+        return None
+
+    f.seek(offset)
+    block = f.read(block_size)
+    extra_len = _HEADER.unpack_from(block)[4]
+    # Skip the header and the CRC32/ISIZE trailer
+    return zlib.decompress(block[_HEADER.size + extra_len:-8], -15)
+
+
+def is_bgzf(path):
+    with open(path, 'rb') as f:
+        try:
+            return _read_block_size(f) is not None
+        except (ValueError, struct.error):
+            return False
+
+
+def block_offsets(path):
+    """Returns the file offsets of all the blocks of a BGZF file."""
+    offsets = []
+    with open(path, 'rb') as f:
+        while True:
+            offset = f.tell()
+            block_size = _read_block_size(f)
+            if block_size is None:
+                break
+            offsets.append(offset)
+            f.seek(offset + block_size)
+
+    return offsets
+
+
+def read_range(f, start, end=None):
+    """
+    Returns the uncompressed data between two virtual offsets
+    (or until the end of the file).
+    """
+    start_block, start_within = split_virtual_offset(start)
+    end_block, end_within = split_virtual_offset(end) \
+        if end is not None else (None, None)
+
+    data = []
+    f.seek(start_block)
+    while True:
+        offset = f.tell()
+        if end_block is not None and offset > end_block:
+            break
+
+        block = read_block(f)
+        if block is None:
+            break
+
+        if offset == end_block:
+            block = block[:end_within]
+        if offset == start_block:
+            block = block[start_within:]
+        data.append(block)
+
+    return b''.join(data)
+
+
+def iter_lines(f, start=0):
+    """
+    Yields the (virtual offset, line) of each line of a BGZF file,
+    from a virtual offset (which must be the start of a line).
+    """
+    block_offset, within = split_virtual_offset(start)
+    f.seek(block_offset)
+    partial, partial_offset = [], None
+    while True:
+        block = read_block(f)
+        if block is None:
+            break
+
+        i = within
+        while i < len(block):
+            if partial_offset is None:
+                partial_offset = make_virtual_offset(block_offset, i)
+            j = block.find(b'\n', i)
+            if j < 0:
+                partial.append(block[i:])
+                break
+            partial.append(block[i:j + 1])
+            yield partial_offset, b''.join(partial)
+            partial, partial_offset = [], None
+            i = j + 1
+
+        within = 0
+        block_offset = f.tell()
+
+    if partial:
+        yield partial_offset, b''.join(partial)
+
+
+def read_tabix_index(path):
+    """
+    Parses a tabix (.tbi) index. Returns a dict with the
+    index parameters, the sequence names, and for each sequence its
+    bins (bin number to a list of (start, end) virtual offset chunks)
+    and linear index (virtual offsets of 16kb windows).
+    """
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:4] != b'TBI\x01':
+        raise ValueError('Invalid tabix index: {0}'.format(path))
+
+    (n_ref, fmt, col_seq, col_beg, col_end,
+     meta, skip, l_nm) = struct.unpack_from('<8i', data, 4)
+    pos = 36
+    names = [n.decode('ascii') for n in data[pos:pos + l_nm].split(b'\x00')
+             if n]
+    pos += l_nm
+
+    refs = []
+    for _ in range(n_ref):
+        bins = {}
+        n_bin = struct.unpack_from('<i', data, pos)[0]
+        pos += 4
+        for _ in range(n_bin):
+            bin_number, n_chunk = struct.unpack_from('<Ii', data, pos)
+            pos += 8
+            chunks = struct.unpack_from('<{0}Q'.format(2 * n_chunk), data, pos)
+            pos += 16 * n_chunk
+            bins[bin_number] = list(zip(chunks[::2], chunks[1::2]))
+
+        n_intv = struct.unpack_from('<i', data, pos)[0]
+        pos += 4
+        linear = list(struct.unpack_from('<{0}Q'.format(n_intv), data, pos))
+        pos += 8 * n_intv
+        refs.append({'bins': bins, 'linear': linear})
+
+    return {
+        'format': fmt,
+        'col_seq': col_seq,
+        'col_beg': col_beg,
+        'col_end': col_end,
+        'meta': chr(meta),
+        'skip': skip,
+        'names': names,
+        'refs': refs,
+    }
+
+
+def tabix_path(path):
+    """Returns the path of the tabix index of a file, if it exists."""
+    index_path = path + '.tbi'
+    return index_path if os.path.exists(index_path) else None
+
+
+def region_to_bin(start, end):
+    """
+    Returns the smallest bin (of the UCSC binning scheme used by tabix)
+    containing a 0-based, half-open region.
+    """
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if start >> shift == end >> shift:
+            return offset + (start >> shift)
+    return 0
+
+
+def region_to_bins(start, end):
+    """
+    Returns the bins that may contain intervals overlapping with
+    a 0-based, half-open region.
+    """
+    end = min(end, 1 << 29) - 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (start >> shift), offset + (end >> shift) + 1))
+    return bins
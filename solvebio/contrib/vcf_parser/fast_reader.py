@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import io
+import re
+import gzip
+import collections
+
+# Types of the reserved INFO fields (from the VCF specification),
+# used when a field is not described in the header.
+RESERVED_INFO = {
+    'AA': 'String', 'AC': 'Integer', 'AF': 'Float', 'AN': 'Integer',
+    'BQ': 'Float', 'CIGAR': 'String', 'DB': 'Flag', 'DP': 'Integer',
+    'END': 'Integer', 'H2': 'Flag', 'H3': 'Flag', 'MQ': 'Float',
+    'MQ0': 'Integer', 'NS': 'Integer', 'SB': 'String', 'SOMATIC': 'Flag',
+    'VALIDATED': 'Flag', '1000G': 'Flag',
+    # Keys used for structural variants
+    'IMPRECISE': 'Flag', 'NOVEL': 'Flag', 'SVTYPE': 'String',
+    'SVLEN': 'Integer', 'CIPOS': 'Integer', 'CIEND': 'Integer',
+    'HOMLEN': 'Integer', 'HOMSEQ': 'String', 'BKPTID': 'String',
+    'MEINFO': 'String', 'METRANS': 'String', 'DGVID': 'String',
+    'DBVARID': 'String', 'DBRIPID': 'String', 'MATEID': 'String',
+    'PARID': 'String', 'EVENT': 'String', 'CILEN': 'Integer',
+    'DPADJ': 'Integer', 'CN': 'Integer', 'CNADJ': 'Integer',
+    'CICN': 'Integer', 'CICNADJ': 'Integer',
+}
+
+# Header numbers that are not integers
+FIELD_COUNTS = {'.': None, 'A': -1, 'G': -2, 'R': -3}
+
+Info = collections.namedtuple(
+    'Info', ['id', 'num', 'type', 'desc', 'source', 'version'])
+
+INFO_PATTERN = re.compile(r'''\#\#INFO=<
+    ID=(?P<id>[^,]+),\s*
+    Number=(?P<number>-?\d+|\.|[AGR])?,\s*
+    Type=(?P<type>Integer|Float|Flag|Character|String),\s*
+    Description="(?P<desc>[^"]*)"
+    (?:,\s*Source="(?P<source>[^"]*)")?
+    (?:,\s*Version="?(?P<version>[^"]*)"?)?
+    >''', re.VERBOSE)
+
+# Key/value pairs of INFO header lines that do not match INFO_PATTERN
+# (i.e. with attributes in a different order, or extra attributes)
+INFO_ATTRIBUTE_PATTERN = re.compile(r'(\w+)=("[^"]*"|[^,>]*)')
+
+INFO_TYPES = ('Integer', 'Float', 'Flag', 'Character', 'String')
+
+# INFO values parsed as None (as PyVCF's Reader._map)
+MISSING_VALUES = ('.', '')
+
+
+def _parse_info_header(line):
+    """
+    Parses an ##INFO header line into an Info tuple.
+    Raises a SyntaxError (as PyVCF) if the line is malformed.
+    """
+    match = INFO_PATTERN.match(line)
+    if match:
+        values = match.groupdict()
+    else:
+        body = line.rstrip('\r\n')
+        if not (body.startswith('##INFO=<') and body.endswith('>')):
+            raise SyntaxError(
+                'One of the INFO lines is malformed: {0}'.format(line))
+        values = dict(
+            (key.lower(), value[1:-1] if value.startswith('"') else value)
+            for key, value in INFO_ATTRIBUTE_PATTERN.findall(body[8:-1]))
+        values['desc'] = values.pop('description', None)
+        number = values.get('number')
+        if not values.get('id') or values.get('type') not in INFO_TYPES or \
+                (number and number not in FIELD_COUNTS and
+                 not re.match(r'^-?\d+$', number)):
+            raise SyntaxError(
+                'One of the INFO lines is malformed: {0}'.format(line))
+
+    number = values.get('number') or None
+    if number is not None:
+        number = FIELD_COUNTS[number] \
+            if number in FIELD_COUNTS else int(number)
+    return Info(values['id'], number, values['type'], values.get('desc'),
+                values.get('source'), values.get('version'))
+
+
+class Record(object):
+    """A VCF row, with the same attribute names as PyVCF records."""
+    __slots__ = ('CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO')
+
+    def __init__(self, CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO):
+        self.CHROM = CHROM
+        self.POS = POS
+        self.ID = ID
+        self.REF = REF
+        self.ALT = ALT
+        self.QUAL = QUAL
+        self.FILTER = FILTER
+        self.INFO = INFO
+
+
+def _float(value):
+    if value in MISSING_VALUES:
+        return None
+    value = float(value)
+    # Convert NaN to None. NaN breaks JSON
+    # convertion code downstream.
+    return value if value == value else None
+
+
+def _info_parser(entry_type, single):
+    """
+    Returns a function that parses the value of an INFO entry
+    (or None if the entry has no value), with the same results
+    as VCFReader._parse_info.
+    """
+    if entry_type == 'Flag':
+        return lambda value: True
+
+    if entry_type in ('Integer', 'Float'):
+        def _parse(value):
+            if value is None:
+                return True
+
+            vals = value.split(',')
+            if entry_type == 'Integer':
+                try:
+                    val = [int(v) if v not in MISSING_VALUES else None
+                           for v in vals]
+                except ValueError:
+                    # Allow specified integers to be flexibly parsed as floats.
+                    val = [_float(v) for v in vals]
+            else:
+                val = [_float(v) for v in vals]
+
+            return val[0] if single else val
+
+        if not single:
+            return _parse
+
+        # Fast paths for the most common single values
+        if entry_type == 'Integer':
+            def _parse_single(value):
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    return _parse(value)
+        else:
+            def _parse_single(value):
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    return _parse(value)
+                return value if value == value else None
+
+        return _parse_single
+
+    def _parse_string(value):
+        if not value:
+            # Strings without values are parsed as flags
+            return True
+
+        if ',' not in value:
+            if value == '.':
+                value = None
+            return value if single else [value]
+
+        # Support quoted strings (test if string is quoted).
+        if value[0] + value[-1] in ('""', "''"):
+            val = [value]
+        else:
+            # Commas are reserved characters indicating multiple values.
+            val = [v if v not in MISSING_VALUES else None
+                   for v in value.split(',')]
+
+        return val[0] if single else val
+
+    return _parse_string
+
+
+class FastVCFReader(object):
+    """
+    A fast VCF reader that does not depend on PyVCF, for use with
+    ExpandingVCFParser (`reader_class=FastVCFReader`).
+
+    It implements the parts of the PyVCF Reader interface used by the
+    parser, and yields records with the same CHROM, POS, ID, REF, ALT,
+    QUAL, FILTER and INFO values as VCFReader, except that ALT values
+    are strings (or None) rather than PyVCF objects.
+
+    Rows are split once, INFO entries are parsed with converters built
+    from the header (once per INFO field), and sample columns are not
+    parsed at all.
+    """
+
+    def __init__(self, fsock=None, filename=None, compressed=None,
+                 prepend_chr=False, strict_whitespace=False,
+                 encoding='ascii'):
+        if not (fsock or filename):
+            raise Exception('You must provide at least fsock or filename')
+
+        if fsock:
+            stream = fsock
+            if filename is None and hasattr(fsock, 'name'):
+                filename = fsock.name
+        else:
+            stream = io.open(filename, 'rb')
+
+        if compressed is None:
+            compressed = bool(filename) and \
+                str(filename).endswith(('.gz', '.bgz'))
+        if compressed:
+            stream = io.TextIOWrapper(gzip.GzipFile(fileobj=stream),
+                                      encoding=encoding)
+        elif not isinstance(stream, io.TextIOBase) and \
+                'b' in getattr(stream, 'mode', ''):
+            stream = io.TextIOWrapper(stream, encoding=encoding)
+
+        self._reader = stream
+        self.reader = stream
+        self.filename = filename
+        self.encoding = encoding
+        self._prepend_chr = prepend_chr
+        self._strict_whitespace = strict_whitespace
+        self._row_pattern = re.compile('\t' if strict_whitespace else '\t| +')
+
+        self.metadata = collections.OrderedDict()
+        self.infos = collections.OrderedDict()
+        self._header_lines = []
+        self._column_headers = []
+        self.samples = []
+        self._info_parsers = {}
+        self._parse_metainfo()
+
+    def _parse_metainfo(self):
+        line = next(self.reader)
+        while line.startswith('##'):
+            self._header_lines.append(line)
+            if line.startswith('##INFO'):
+                info = _parse_info_header(line)
+                self.infos[info.id] = info
+            elif '=' in line:
+                key, value = line[2:].rstrip('\r\n').split('=', 1)
+                self.metadata.setdefault(key, []).append(value)
+
+            line = next(self.reader)
+
+        fields = self._row_pattern.split(line[1:].rstrip())
+        self._column_headers = fields[:9]
+        self.samples = fields[9:]
+
+    def _info_parser(self, _id):
+        info = self.infos.get(_id)
+        if info is not None:
+            parser = _info_parser(info.type, info.num == 1)
+        else:
+            parser = _info_parser(RESERVED_INFO.get(_id, 'String'), False)
+
+        self._info_parsers[_id] = parser
+        return parser
+
+    def _parse_info(self, info_str):
+        if info_str == '.':
+            return {}
+
+        parsers = self._info_parsers
+        retdict = {}
+        for entry in info_str.split(';'):
+            _id, sep, value = entry.partition('=')
+            try:
+                parser = parsers[_id]
+            except KeyError:
+                parser = self._info_parser(_id)
+            retdict[_id] = parser(value if sep else None)
+
+        return retdict
+
+    def parse_line(self, line):
+        """Parses a VCF data line into a Record."""
+        if self._strict_whitespace:
+            # Only split the first 8 columns,
+            # sample columns are not parsed.
+            row = line.split('\t', 8)
+            if len(row) < 9:
+                row[-1] = row[-1].rstrip()
+        else:
+            row = self._row_pattern.split(line.rstrip())
+
+        chrom = row[0]
+        if self._prepend_chr:
+            chrom = 'chr' + chrom
+
+        ID = row[2]
+        if ID == '.':
+            ID = None
+
+        alt = [a if a != '.' else None for a in row[4].split(',')]
+
+        qual = row[5]
+        if qual == '.':
+            qual = None
+        else:
+            try:
+                qual = int(qual)
+            except ValueError:
+                try:
+                    qual = float(qual)
+                except ValueError:
+                    qual = None
+
+        filt = row[6]
+        if filt == '.':
+            filt = None
+        elif filt == 'PASS':
+            filt = []
+        else:
+            filt = filt.split(';')
+
+        return Record(chrom, int(row[1]), ID, row[3], alt, qual, filt,
+                      self._parse_info(row[7]))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        return self.parse_line(next(self.reader))
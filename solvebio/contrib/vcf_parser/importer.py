@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+
+import six
+
+from solvebio import DatasetImport
+from solvebio.utils.concurrency import DEFAULT_WORKERS
+
+from .vcf_parser import ExpandingVCFParser
+
+
+def import_vcf(vcf, dataset, chunk_size=DatasetImport.RECORDS_CHUNK_SIZE,
+               concurrency=DEFAULT_WORKERS, follow=True, **params):
+    """
+    Parses a VCF file and streams the parsed records into a dataset,
+    without writing them to disk: parsing overlaps with the imports,
+    and only a bounded number of records are held in memory
+    (see DatasetImport.create_from_records).
+
+    The VCF can be provided as a path (parsed with the default
+    ExpandingVCFParser settings), as a parser, or as any iterable
+    of parsed records (i.e. the rows of a parallel parser, or of
+    parser.fetch()). The dataset can be provided as an object or as
+    an ID. Other parameters (i.e. commit_mode) are used for all
+    the imports.
+
+    Returns the list of imports. By default, waits for all the
+    imports (and their commits) to finish.
+    """
+    try:
+        dataset_id = dataset.id
+    except AttributeError:
+        dataset_id = dataset
+
+    parser = vcf
+    if isinstance(vcf, six.string_types):
+        parser = ExpandingVCFParser(filename=vcf)
+
+    try:
+        return DatasetImport.create_from_records(
+            dataset_id, parser, chunk_size=chunk_size,
+            concurrency=concurrency, follow=follow, **params)
+    finally:
+        if parser is not vcf:
+            parser.close()
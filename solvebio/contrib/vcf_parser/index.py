@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Region indexes for sorted VCF files, used by ExpandingVCFParser.fetch().
+
+Both indexes return, for a region, the (start, end) file offsets
+of the parts of the file that may contain overlapping records:
+virtual offsets for BGZF-compressed files, or byte offsets for
+uncompressed files. An end of None is the end of the file.
+"""
+from __future__ import absolute_import
+
+import os
+import json
+import gzip
+
+from . import bgzf
+
+# Size of the windows of the linear indexes (16kb, as in tabix)
+WINDOW_SHIFT = 14
+
+# Largest position supported by tabix indexes
+MAX_POSITION = 1 << 29
+
+# Extension of the position indexes cached next to the indexed files
+POSITION_INDEX_EXTENSION = '.sbi'
+
+
+def _chromosome(name):
+    return str(name).replace('chr', '')
+
+
+def iter_lines(f, start=0, compressed=True):
+    """
+    Yields the (offset, line) of each line of a BGZF-compressed
+    (or uncompressed) file, from an offset.
+    """
+    if compressed:
+        for item in bgzf.iter_lines(f, start):
+            yield item
+        return
+
+    f.seek(start)
+    offset = start
+    for line in f:
+        yield offset, line
+        offset += len(line)
+
+
+class TabixIndex(object):
+    """Region lookups using the tabix index (.tbi) of a BGZF file."""
+    compressed = True
+
+    def __init__(self, path):
+        self.path = path
+        self._index = bgzf.read_tabix_index(path)
+        self._names = dict((_chromosome(name), i)
+                           for i, name in enumerate(self._index['names']))
+
+    def chunks(self, chromosome, start, stop):
+        i = self._names.get(_chromosome(chromosome))
+        if i is None:
+            return []
+
+        ref = self._index['refs'][i]
+        # Tabix bins use 0-based, half-open intervals
+        begin, end = start - 1, stop
+        linear = ref['linear']
+        window = begin >> WINDOW_SHIFT
+        if window < len(linear):
+            min_offset = linear[window]
+        else:
+            min_offset = linear[-1] if linear else 0
+
+        chunks = sorted(
+            (max(chunk_start, min_offset), chunk_end)
+            for bin_number in bgzf.region_to_bins(begin, end)
+            for chunk_start, chunk_end in ref['bins'].get(bin_number, [])
+            if chunk_end > min_offset)
+
+        merged = []
+        for chunk_start, chunk_end in chunks:
+            if merged and chunk_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_start, chunk_end))
+
+        return merged
+
+
+class PositionIndex(object):
+    """
+    A lightweight linear index of a sorted VCF file (BGZF-compressed
+    or uncompressed), for files without a tabix index.
+
+    For each chromosome, it stores the offset of the first record
+    overlapping each 16kb window, and the offset following its last
+    record. It is built with a single pass over the file, and cached
+    as JSON next to the file (<path>.sbi) when possible. The cached
+    index is rebuilt when the file size or modification time changes.
+    """
+    VERSION = 1
+
+    def __init__(self, chromosomes, compressed, size=None, mtime=None):
+        self.chromosomes = chromosomes
+        self.compressed = compressed
+        self.size = size
+        self.mtime = mtime
+        self._names = dict((_chromosome(name), name) for name in chromosomes)
+
+    @classmethod
+    def build(cls, path):
+        compressed = bgzf.is_bgzf(path)
+        with open(path, 'rb') as f:
+            if not compressed and f.read(2) == b'\x1f\x8b':
+                raise Exception(
+                    'Cannot index {0}: gzip-compressed files must be '
+                    'compressed with bgzip'.format(path))
+
+        chromosomes = {}
+        current = None
+        with open(path, 'rb') as f:
+            for offset, line in iter_lines(f, compressed=compressed):
+                if line.startswith(b'#') or not line.strip():
+                    continue
+
+                chromosome, position, _, ref = \
+                    line.decode('ascii').split('\t', 4)[:4]
+                position = int(position)
+                if chromosome != current:
+                    if chromosome in chromosomes:
+                        raise Exception(
+                            'Cannot index {0}: the file is not sorted '
+                            '(by chromosome and position)'.format(path))
+                    if current is not None:
+                        chromosomes[current]['end'] = offset
+                    current, last_position = chromosome, 0
+                    chromosomes[chromosome] = {'linear': [], 'end': None}
+                elif position < last_position:
+                    raise Exception(
+                        'Cannot index {0}: the file is not sorted '
+                        '(by chromosome and position)'.format(path))
+                last_position = position
+
+                # Windows of the 0-based, half-open record interval
+                linear = chromosomes[chromosome]['linear']
+                begin = position - 1
+                end = begin + max(len(ref), 1)
+                for window in range(begin >> WINDOW_SHIFT,
+                                    ((end - 1) >> WINDOW_SHIFT) + 1):
+                    if window >= len(linear):
+                        linear.extend([None] * (window + 1 - len(linear)))
+                    if linear[window] is None:
+                        linear[window] = offset
+
+        # Windows without records point to the next record
+        for chromosome in chromosomes.values():
+            linear = chromosome['linear']
+            for window in reversed(range(len(linear) - 1)):
+                if linear[window] is None:
+                    linear[window] = linear[window + 1]
+
+        stat = os.stat(path)
+        return cls(chromosomes, compressed, stat.st_size, stat.st_mtime)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        if data.get('version') != cls.VERSION:
+            raise ValueError('Unsupported index version: {0}'.format(path))
+        return cls(data['chromosomes'], data['compressed'],
+                   data['size'], data['mtime'])
+
+    def save(self, path):
+        data = {
+            'version': self.VERSION,
+            'compressed': self.compressed,
+            'size': self.size,
+            'mtime': self.mtime,
+            'chromosomes': self.chromosomes,
+        }
+        with gzip.open(path, 'wb') as f:
+            f.write(json.dumps(data).encode('utf-8'))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Loads the cached index of a file, or builds it
+        (and caches it, if the directory is writable).
+        """
+        index_path = path + POSITION_INDEX_EXTENSION
+        stat = os.stat(path)
+        if os.path.exists(index_path):
+            try:
+                index = cls.load(index_path)
+                if (index.size, index.mtime) == (stat.st_size, stat.st_mtime):
+                    return index
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+
+        index = cls.build(path)
+        try:
+            index.save(index_path)
+        except (IOError, OSError):
+            pass
+        return index
+
+    def chunks(self, chromosome, start, stop):
+        name = self._names.get(_chromosome(chromosome))
+        if name is None:
+            return []
+
+        entry = self.chromosomes[name]
+        linear = entry['linear']
+        window = (start - 1) >> WINDOW_SHIFT
+        if window >= len(linear):
+            # All the records end before the region
+            return []
+        return [(linear[window], entry['end'])]
+
+
+def open_index(path):
+    """
+    Returns the tabix index of a file if it has one,
+    otherwise its (cached) position index.
+    """
+    index_path = bgzf.tabix_path(path)
+    if index_path:
+        return TabixIndex(index_path)
+    return PositionIndex.open(path)
@@ -2,8 +2,32 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
-from vcf.parser import Reader
-from vcf.parser import RESERVED_INFO
+import gc
+import io
+import gzip
+import pickle
+import contextlib
+import collections
+import multiprocessing
+
+try:
+    from vcf.parser import Reader
+    from vcf.parser import RESERVED_INFO
+except ImportError:
+    # PyVCF is optional when using the FastVCFReader
+    Reader = object
+    from .fast_reader import RESERVED_INFO
+
+from . import bgzf
+from .fast_reader import FastVCFReader
+from .snpeff import AnnParser
+from .index import MAX_POSITION
+from .index import iter_lines
+from .index import open_index
+from ...query import GenomicFilter
+
+# Default size (in compressed bytes) of the chunks parsed in parallel
+PARALLEL_CHUNK_SIZE = 1024 * 1024
 
 
 class VCFReader(Reader):
@@ -43,13 +67,13 @@ class VCFReader(Reader):
                     val = self._map(float, vals)
                     # Convert NaN to None. NaN breaks JSON
                     # convertion code downstream.
-                    val = map(lambda x: x if x == x else None, val)
+                    val = [x if x == x else None for x in val]
             elif entry_type == 'Float':
                 vals = entry[1].split(',')
                 val = self._map(float, vals)
                 # Convert NaN to None. NaN breaks JSON
                 # convertion code downstream.
-                val = map(lambda x: x if x == x else None, val)
+                val = [x if x == x else None for x in val]
             elif entry_type == 'Flag':
                 val = True
             elif entry_type in ('String', 'Character'):
@@ -84,7 +108,25 @@ class ExpandingVCFParser(object):
     as a record. Also, no validation/conversion is done for chromosome,
     or allele fields.
 
-    Requires PyVCF 0.6.8+ (pip install PyVCF).
+    Requires PyVCF 0.6.8+ (pip install PyVCF), unless the faster,
+    PyVCF-free reader is used: `reader_class=FastVCFReader` (which is
+    the default when PyVCF is not installed).
+
+    BGZF-compressed files (i.e. compressed with bgzip) can be parsed
+    in parallel by multiple processes with `processes=N`. The file is
+    split into chunks of about `chunk_size` compressed bytes, on the
+    record boundaries of its tabix index (.tbi) if there is one, or on
+    BGZF block boundaries otherwise. Rows are returned in the file order,
+    unless `ordered=False`, in which case chunks are returned as soon as
+    they are parsed (and `_line_number` only counts the source lines
+    read so far).
+
+    SnpEff ANN annotations are parsed into a list of dicts, or into
+    a dict of parallel lists (one per ANN key) with `ann_columns=True`.
+
+    Sorted files (compressed with bgzip, or uncompressed) can be
+    queried by region with `fetch()` and `fetch_regions()`, using their
+    tabix index or a position index cached next to the file.
     """
     DEFAULT_BUILD = 'GRCh37'
 
@@ -92,10 +134,18 @@ class ExpandingVCFParser(object):
         self._reader = None
         self._line_number = -1
         self._next = []
+        self._parallel = None
+        self._index = None
+        self.processes = kwargs.pop('processes', None)
+        self.ordered = kwargs.pop('ordered', True)
+        self.chunk_size = kwargs.pop('chunk_size', PARALLEL_CHUNK_SIZE)
+        self.ann_columns = kwargs.pop('ann_columns', False)
         # Default INFO field parser is pass-through
         self._parse_info = lambda x: x
         self.genome_build = kwargs.pop('genome_build', 'GRCh37')
-        self.reader_class = kwargs.pop('reader_class', VCFReader)
+        self.reader_class = kwargs.pop(
+            'reader_class',
+            VCFReader if Reader is not object else FastVCFReader)
 
         self.reader_kwargs = kwargs
         # Set default reader kwargs
@@ -117,53 +167,31 @@ class ExpandingVCFParser(object):
             # Setup extra INFO field parsing
             if self._reader.metadata.get('SnpEffCmd'):
                 # Only proceed if ANN description exists (ANN fields)
-                # The field keys may vary between SnpEff versions:
-                # http://snpeff.sourceforge.net/VCFannotationformat_v1.0.pdf
-                # Here we find them dynamically in the VCF header:
+                # The field keys may vary between SnpEff versions,
+                # here we find them dynamically in the VCF header.
                 ann_info = self._reader.infos.get('ANN')
                 if ann_info:
                     self._parse_info = self._parse_info_snpeff
-                    # The infos['ANN'] description looks like:
-                    #    Functional annotations: 'A | B | C'
-                    # where A, B, and C are ANN keys.
-                    self._snpeff_ann_fields = []
-                    for field in ann_info.desc.split('\'')[1].split('|'):
-                        # Field names should not contain [. /]
-                        self._snpeff_ann_fields.append(
-                            field.strip()
-                            .replace('.', '_')
-                            .replace('/', '_')
-                            .replace(' ', ''))
+                    self._ann_parser = AnnParser.from_description(
+                        ann_info.desc, columns=self.ann_columns)
+                    self._snpeff_ann_fields = self._ann_parser.fields
 
         return self._reader
 
     def _parse_info_snpeff(self, info):
         """
         Specialized INFO field parser for SnpEff ANN fields.
-        Requires self._snpeff_ann_fields to be set.
+        Requires self._ann_parser to be set.
         """
         ann = info.pop('ANN', []) or []
+        # For multi-allelic records, we may have already
+        # processed ANN. If so, quit now.
+        if isinstance(ann, dict) or (ann and isinstance(ann[0], dict)):
+            info['ANN'] = ann
+            return info
+
         # Overwrite the existing ANN with something parsed
-        # Split on '|', merge with the ANN keys parsed above.
-        # Ensure empty values are None rather than empty string.
-        items = []
-        for a in ann:
-            # For multi-allelic records, we may have already
-            # processed ANN. If so, quit now.
-            if isinstance(a, dict):
-                info['ANN'] = ann
-                return info
-
-            values = [i or None for i in a.split('|')]
-            item = dict(zip(self._snpeff_ann_fields, values))
-
-            # Further split the Annotation field by '&'
-            if item.get('Annotation'):
-                item['Annotation'] = item['Annotation'].split('&')
-
-            items.append(item)
-
-        info['ANN'] = items
+        info['ANN'] = self._ann_parser(ann)
         return info
 
     @property
@@ -171,7 +199,10 @@ class ExpandingVCFParser(object):
         return self.reader._reader
 
     def close(self):
-        self.file.close()
+        if self._parallel is not None:
+            self._parallel.close()
+        if not self.processes or self._reader:
+            self.file.close()
 
     def __enter__(self):
         """For use as a context manager"""
@@ -193,17 +224,15 @@ class ExpandingVCFParser(object):
         using an internal buffer (_next).
         """
 
-        def _alt(alt):
-            """Parses the VCF row ALT object."""
-            # If alt is '.' in VCF, PyVCF returns None, convert back to '.'
-            if not alt:
-                return '.'
-            else:
-                return str(alt)
-
-        if not self._next:
+        if self.processes and not self._next:
+            if self._parallel is None:
+                self._parallel = self._parallel_rows()
+            self._next = next(self._parallel)
+            self._line_number += 1
+        elif not self._next:
             row = next(self.reader)
-            alternate_alleles = list(map(_alt, row.ALT))
+            # If alt is '.' in VCF, PyVCF returns None, convert back to '.'
+            alternate_alleles = [str(alt) if alt else '.' for alt in row.ALT]
 
             for allele in alternate_alleles:
                 self._next.append(
@@ -217,35 +246,231 @@ class ExpandingVCFParser(object):
 
         return self._next.pop()
 
+    def _header(self, path):
+        """Returns the header lines of a (compressed) VCF file."""
+        encoding = self.reader_kwargs.get('encoding', 'ascii')
+        with open(path, 'rb') as f:
+            compressed = f.read(2) == b'\x1f\x8b'
+
+        header = []
+        with gzip.open(path, 'rb') if compressed else open(path, 'rb') as f:
+            for line in f:
+                if not line.startswith(b'#'):
+                    break
+                header.append(line.decode(encoding))
+        return header
+
+    def _parser_kwargs(self):
+        """
+        Returns the kwargs of a parser with the same settings,
+        for the lines of a file provided as fsock.
+        """
+        parser_kwargs = dict(self.reader_kwargs)
+        parser_kwargs.pop('filename', None)
+        parser_kwargs.pop('fsock', None)
+        parser_kwargs['compressed'] = False
+        parser_kwargs.update(genome_build=self.genome_build,
+                             reader_class=self.reader_class,
+                             ann_columns=self.ann_columns)
+        return parser_kwargs
+
+    @property
+    def index(self):
+        """
+        The region index of the file: its tabix index if it has one,
+        otherwise a position index built (and cached) on first use.
+        """
+        if self._index is None:
+            path = self.reader_kwargs.get('filename')
+            if not path:
+                raise Exception('Region queries require a filename')
+            self._index = open_index(path)
+        return self._index
+
+    def fetch(self, chromosome, start=None, stop=None, exact=False):
+        """
+        Returns the rows overlapping with a region (or only the rows
+        matching it exactly, with `exact`), using the region index of
+        the file. The file must be sorted, and either compressed with
+        bgzip or uncompressed.
+
+        The region can be provided as a chromosome and 1-based start and
+        stop positions (the whole chromosome if start is None), or as
+        a UCSC-style string ("chr1:100-200"). Chromosome names
+        match with or without the "chr" prefix.
+
+        Fetching rows does not change the position (or _line_number)
+        of the parser when iterating over the whole file.
+        """
+        if start is None and ':' in chromosome:
+            chromosome, start, stop = GenomicFilter._parse_string(chromosome)
+        return self._fetch([(chromosome, start, stop)], exact)
+
+    def fetch_regions(self, regions, exact=False):
+        """
+        Returns the rows overlapping with any of the regions, which
+        can be provided in any format supported by
+        GenomicFilter.from_regions (i.e. a BED file, UCSC-style
+        strings, or tuples). Overlapping regions are merged, so that
+        each row is only returned once.
+        """
+        regions = GenomicFilter.from_regions(regions, exact=exact).regions
+        return self._fetch(regions, exact)
+
+    def _fetch(self, regions, exact):
+        index = self.index
+        path = self.reader_kwargs.get('filename')
+        encoding = self.reader_kwargs.get('encoding', 'ascii')
+
+        # A generator, so that closing the parser closes the file
+        def _lines():
+            for line in self._header(path):
+                yield line
+
+            with open(path, 'rb') as f:
+                for chromosome, start, stop in regions:
+                    if start is None:
+                        start, stop = 1, MAX_POSITION
+                    else:
+                        start = int(start)
+                        stop = int(stop) if stop is not None else start
+                    for chunk_start, chunk_end in \
+                            index.chunks(chromosome, start, stop):
+                        for line in self._region_lines(
+                                f, index, chunk_start, chunk_end,
+                                chromosome, start, stop, exact):
+                            yield line.decode(encoding)
+
+        return iter(self.__class__(fsock=_lines(), **self._parser_kwargs()))
+
+    @staticmethod
+    def _region_lines(f, index, chunk_start, chunk_end,
+                      chromosome, start, stop, exact):
+        chromosome = chromosome.replace('chr', '')
+        for offset, line in iter_lines(f, chunk_start, index.compressed):
+            if chunk_end is not None and offset >= chunk_end:
+                break
+            if line.startswith(b'#') or not line.strip():
+                continue
+
+            fields = line.split(b'\t', 4)
+            if fields[0].decode('ascii').replace('chr', '') != chromosome:
+                break
+
+            position = int(fields[1])
+            if position > stop:
+                # Records are sorted by position
+                break
+
+            record_stop = position + len(fields[3]) - 1
+            if exact:
+                if position == start and record_stop == stop:
+                    yield line
+            elif record_stop >= start:
+                yield line
+
+    def _chunks(self, path):
+        """
+        Splits a BGZF file into (start, end, previous block) chunks,
+        on record boundaries if the file has a tabix index (in which case
+        the previous block is None). Otherwise, chunks start and end on
+        block boundaries, and the previous block is used to find the first
+        complete line of each chunk (-1 for the first chunk).
+        """
+        index_path = bgzf.tabix_path(path)
+        if index_path:
+            index = bgzf.read_tabix_index(index_path)
+            offsets = sorted(set(
+                offset for ref in index['refs'] for offset in ref['linear']))
+            aligned = True
+        else:
+            offsets = [bgzf.make_virtual_offset(offset, 0)
+                       for offset in bgzf.block_offsets(path)]
+            aligned = False
+
+        # Chunk starts, with the block preceding each start
+        starts = [(0, -1)]
+        previous = -1
+        for offset in offsets:
+            if (offset >> 16) - (starts[-1][0] >> 16) >= self.chunk_size:
+                starts.append((offset, previous))
+            previous = offset >> 16
+
+        chunks = []
+        for i, (start, previous) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else None
+            chunks.append((start, end, None if aligned else previous))
+
+        return chunks
+
+    def _parallel_rows(self):
+        """
+        Parses chunks of the file in a process pool, and yields the
+        rows of each source line (as a list, in reverse order).
+        """
+        path = self.reader_kwargs.get('filename')
+        if not path or not bgzf.is_bgzf(path):
+            raise Exception(
+                'Parallel parsing requires a BGZF-compressed filename '
+                '(compressed with bgzip)')
+
+        header = ''.join(self._header(path))
+        parser_kwargs = self._parser_kwargs()
+        pool = multiprocessing.Pool(self.processes)
+        pending = collections.deque()
+        try:
+            for start, end, previous in self._chunks(path):
+                pending.append(pool.apply_async(
+                    _parse_chunk,
+                    ((self.__class__, parser_kwargs, header, path,
+                      start, end, previous),)))
+
+                # Limit the number of parsed chunks kept in memory
+                while len(pending) >= 2 * self.processes:
+                    for rows in self._next_chunk(pending):
+                        yield rows
+
+            while pending:
+                for rows in self._next_chunk(pending):
+                    yield rows
+        finally:
+            pool.terminate()
+
+    def _next_chunk(self, pending):
+        if not self.ordered:
+            while True:
+                for result in pending:
+                    if result.ready():
+                        pending.remove(result)
+                        return _loads(result.get())
+                pending[0].wait(0.01)
+
+        return _loads(pending.popleft().get())
+
     def row_to_dict(self, row, allele, alternate_alleles):
         """Return a parsed dictionary for JSON."""
 
-        def _variant_sbid(**kwargs):
-            """Generates a SolveBio variant ID (SBID)."""
-            return '{build}-{chromosome}-{start}-{stop}-{allele}'\
-                .format(**kwargs).upper()
-
+        ref = row.REF
         if allele == '.':
             # Try to use the ref, if '.' is supplied for alt.
-            allele = row.REF or allele
-
-        genomic_coordinates = {
-            'build': self.genome_build,
-            'chromosome': row.CHROM,
-            'start': row.POS,
-            'stop': row.POS + len(row.REF) - 1
-        }
+            allele = ref or allele
 
-        # SolveBio standard variant format
-        variant_sbid = _variant_sbid(allele=allele,
-                                     **genomic_coordinates)
+        chromosome, start = row.CHROM, row.POS
+        stop = start + len(ref) - 1
 
         return {
-            'genomic_coordinates': genomic_coordinates,
-            'variant': variant_sbid,
+            'genomic_coordinates': {
+                'build': self.genome_build,
+                'chromosome': chromosome,
+                'start': start,
+                'stop': stop
+            },
+            # SolveBio standard variant format (SBID)
+            'variant': '-'.join((str(self.genome_build), str(chromosome),
+                                 str(start), str(stop), allele)).upper(),
             'allele': allele,
             'row_id': row.ID,
-            'reference_allele': row.REF,
+            'reference_allele': ref,
             'alternate_alleles': alternate_alleles,
             'info': self._parse_info(row.INFO),
             'qual': row.QUAL,
@@ -253,6 +478,75 @@ class ExpandingVCFParser(object):
         }
 
 
+@contextlib.contextmanager
+def _gc_disabled():
+    # Parsed rows are not cyclic, and the garbage collector slows
+    # down the creation of large numbers of them considerably.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _loads(data):
+    with _gc_disabled():
+        return pickle.loads(data)
+
+
+def _parse_chunk(args):
+    """
+    Parses a chunk of a BGZF-compressed VCF file (in a worker process),
+    returning the (pickled) rows of each source line.
+    """
+    (parser_class, parser_kwargs, header, path,
+     start, end, previous) = args
+
+    with open(path, 'rb') as f:
+        data = bgzf.read_range(f, start, end)
+
+        if previous is not None and previous >= 0:
+            # The chunk starts on a block boundary: skip the first line
+            # unless the previous block ends with a complete line.
+            f.seek(previous)
+            if not bgzf.read_block(f).endswith(b'\n'):
+                data = data[data.find(b'\n') + 1:] if b'\n' in data else b''
+
+        # Complete the last line, which continues in the next chunk.
+        if previous is not None and end is not None and data and \
+                not data.endswith(b'\n'):
+            f.seek(bgzf.split_virtual_offset(end)[0])
+            extra = []
+            while True:
+                block = bgzf.read_block(f)
+                if block is None:
+                    break
+                if b'\n' in block:
+                    extra.append(block[:block.find(b'\n') + 1])
+                    break
+                extra.append(block)
+            data += b''.join(extra)
+
+    encoding = parser_kwargs.get('encoding', 'ascii')
+    body = ''.join(
+        line for line in data.decode(encoding).splitlines(True)
+        if not line.startswith('#'))
+    parser = parser_class(fsock=io.StringIO(header + body), **parser_kwargs)
+
+    lines = []
+    line_number = None
+    with _gc_disabled():
+        for row in parser:
+            if parser._line_number != line_number:
+                line_number = parser._line_number
+                lines.append([])
+            lines[-1].insert(0, row)
+
+        return pickle.dumps(lines, pickle.HIGHEST_PROTOCOL)
+
+
 if __name__ == '__main__':
     import sys
     import json
@@ -1,16 +1,30 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import os
+import re
 import six
+import gzip
+import collections
+import hashlib
+import operator
+from six.moves import intern
 import json
 import uuid
+import weakref
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 from .client import client
+from .utils.concurrency import DEFAULT_WORKERS
+from .utils.concurrency import imap_ordered
 from .utils.printing import pretty_int
 from .utils.tabulate import tabulate
 from .errors import SolveError
 
-import copy
 import logging
 logger = logging.getLogger('solvebio')
 
@@ -55,11 +69,12 @@ class Filter(object):
                       start__gt=10000,
                       end__lte=20000)
     """
+    # Filters are immutable trees of nodes shared between Filter objects,
+    # so they are never copied. Kept for backwards compatibility.
+    deepcopy = True
+
     def __init__(self, *raw_filters, **filters):
         """Creates a Filter"""
-        # Set deepcopy to False for faster Filter building
-        self.deepcopy = True
-
         filters = list(filters.items())
         for flt in raw_filters:
             try:
@@ -74,10 +89,84 @@ class Filter(object):
 
             filters += flt
 
+        self.filters = filters
+
+    # Filter trees are made of immutable tuple nodes:
+    #
+    #   * (None, <term>): a (field, value) pair, or any raw filter
+    #   * ('not', <node>)
+    #   * ('and' or 'or', <items>): where items is a linked list of
+    #     (<items>, <node>) pairs, ending with None. Combining filters
+    #     adds a node to the end of the list in constant time,
+    #     without modifying the existing Filters.
+
+    @classmethod
+    def _to_node(cls, flt):
+        """Converts a filter (in the API's JSON format) to a node"""
+        if isinstance(flt, dict) and len(flt) == 1:
+            conn, value = list(flt.items())[0]
+            if conn in ('and', 'or') and isinstance(value, list):
+                return (conn, cls._to_items(cls._to_node(v) for v in value))
+            if conn == 'not' and value:
+                return ('not', cls._to_node(value))
+
+        return (None, flt)
+
+    @staticmethod
+    def _to_items(nodes):
+        items = None
+        for node in nodes:
+            items = (items, node)
+        return items
+
+    @staticmethod
+    def _to_json(node):
+        conn, value = node
+        if conn is None:
+            return value
+        if conn == 'not':
+            return {'not': Filter._to_json(value)}
+
+        nodes = []
+        while value is not None:
+            value, child = value
+            nodes.append(child)
+        nodes.reverse()
+        return {conn: [Filter._to_json(child) for child in nodes]}
+
+    @property
+    def filters(self):
+        """
+        The filters in the API's JSON format. They are generated
+        from the node tree on first access and cached.
+        """
+        if self._filters is None:
+            if self._node is None:
+                self._filters = []
+            else:
+                self._filters = [self._to_json(self._node)]
+        return self._filters
+
+    @filters.setter
+    def filters(self, filters):
         if len(filters) > 1:
-            self.filters = [{'and': filters}]
-        else:
-            self.filters = filters
+            filters = [{'and': list(filters)}]
+
+        self._node = self._to_node(filters[0]) if filters else None
+        self._filters = None
+
+    @classmethod
+    def _from_node(cls, node):
+        f = Filter()
+        f._node = node
+        return f
+
+    def __getstate__(self):
+        # Deep node trees are serialized in their JSON format
+        return {'filters': self.filters}
+
+    def __setstate__(self, state):
+        self.filters = state['filters']
 
     def __repr__(self):
         return '<Filter {0}>'.format(self.filters)
@@ -87,30 +176,18 @@ class Filter(object):
         OR and AND will create a new Filter, with the filters from both Filter
         objects combined with the connector `conn`.
         """
-        f = Filter()
-        f.deepcopy = self.deepcopy and other.filters
-
-        if f.deepcopy:
-            self_filters = copy.deepcopy(self.filters)
-            other_filters = copy.deepcopy(other.filters)
+        if self._node is None:
+            node = other._node
+        elif other._node is None:
+            node = self._node
+        elif self._node[0] == conn:
+            node = (conn, (self._node[1], other._node))
+        elif other._node[0] == conn:
+            node = (conn, (other._node[1], self._node))
         else:
-            self_filters = self.filters
-            other_filters = other.filters
-
-        if not self.filters:
-            f.filters = other_filters
-        elif not other.filters:
-            f.filters = self_filters
-        elif conn in self.filters[0]:
-            f.filters = self_filters
-            f.filters[0][conn].extend(other_filters)
-        elif conn in other.filters[0]:
-            f.filters = other_filters
-            f.filters[0][conn].extend(self_filters)
-        else:
-            f.filters = [{conn: self_filters + other_filters}]
+            node = (conn, ((None, self._node), other._node))
 
-        return f
+        return self._from_node(node)
 
     def __or__(self, other):
         return self._combine(other, 'or')
@@ -119,30 +196,407 @@ class Filter(object):
         return self._combine(other, 'and')
 
     def __invert__(self):
-        f = Filter()
-        f.deepcopy = self.deepcopy
+        if self._node is None:
+            # no change
+            node = None
+        elif self._node[0] == 'not':
+            # if the filters are already a single 'not' block
+            # then swap out the 'not'
+            node = self._node[1]
+        else:
+            node = ('not', self._node)
+
+        return self._from_node(node)
 
-        if f.deepcopy:
-            self_filters = copy.deepcopy(self.filters)
+    def normalize(self, scalar_fields=()):
+        """
+        Returns an equivalent Filter in a canonical form, so that
+        logically equivalent filters serialize identically:
+
+          * nested and/or blocks are flattened, double "not" removed
+          * terms are sorted and duplicates are removed
+          * in "or" blocks, exact and `__in` terms on the same field are
+            folded into a single `__in` term and overlapping numeric
+            `__range` terms are merged
+
+        Terms in "and" blocks are only merged for the fields listed in
+        `scalar_fields`, which must hold a single value per record:
+        `__in` terms on the same field are intersected and numeric
+        bounds (`__gt`, `__gte`, `__lt`, `__lte`, `__range`) are merged
+        into the tightest bounds. On list fields, where a term matches
+        if any value matches, this would change the matched records.
+        """
+        return Filter._from_node(
+            None if self._node is None
+            else self._to_node(
+                self._normalize(self.filters[0], frozenset(scalar_fields))))
+
+    # Operators on which terms can be folded or merged
+    _BOUND_OPERATORS = ('gt', 'gte', 'lt', 'lte', 'range')
+
+    @staticmethod
+    def _canonical(flt):
+        return json.dumps(flt, sort_keys=True, separators=(',', ':'),
+                          default=str)
+
+    @staticmethod
+    def _is_term(flt):
+        return isinstance(flt, (tuple, list)) and len(flt) == 2 and \
+            isinstance(flt[0], six.string_types)
+
+    @staticmethod
+    def _is_number(value):
+        return isinstance(value, (six.integer_types, float)) and \
+            not isinstance(value, bool)
+
+    @staticmethod
+    def _split_field(field):
+        """Splits a term field into (field, operator)"""
+        if '__' in field:
+            name, op = field.rsplit('__', 1)
+            if op in ('in', 'between') + Filter._BOUND_OPERATORS:
+                return name, op
+        return field, None
+
+    @classmethod
+    def _sorted_values(cls, values):
+        unique = dict((cls._canonical(v), v) for v in values)
+        return [unique[k] for k in sorted(unique)]
+
+    @classmethod
+    def _normalize(cls, flt, scalar_fields=frozenset()):
+        """Normalizes a filter in the API's JSON format"""
+        if cls._is_term(flt):
+            field, value = flt
+            if cls._split_field(field)[1] == 'in' and isinstance(value, list):
+                value = cls._sorted_values(value)
+            return (field, value)
+
+        if not isinstance(flt, dict) or len(flt) != 1:
+            return flt
+
+        conn, value = list(flt.items())[0]
+        if conn == 'not':
+            value = cls._normalize(value, scalar_fields)
+            if isinstance(value, dict) and list(value.keys()) == ['not']:
+                return value['not']
+            return {'not': value}
+
+        if conn not in ('and', 'or') or not isinstance(value, list) or \
+                not all(cls._is_term(v) or isinstance(v, dict) for v in value):
+            return flt
+
+        children = []
+        for child in value:
+            child = cls._normalize(child, scalar_fields)
+            if isinstance(child, dict) and list(child.keys()) == [conn]:
+                children.extend(child[conn])
+            else:
+                children.append(child)
+
+        children = cls._sorted_values(
+            cls._fold(conn, children, scalar_fields))
+        if len(children) == 1:
+            return children[0]
+        return {conn: children}
+
+    @classmethod
+    def _fold(cls, conn, children, scalar_fields):
+        """Folds the terms on the same fields in an and/or block"""
+        others = []
+        fields = collections.OrderedDict()
+        for child in children:
+            if cls._is_term(child):
+                name, op = cls._split_field(child[0])
+                fields.setdefault(name, []).append((op, child[1], child))
+            else:
+                others.append(child)
+
+        folded = []
+        for name, terms in fields.items():
+            if conn == 'or':
+                folded += cls._fold_or(name, terms)
+            elif name in scalar_fields:
+                folded += cls._fold_and(name, terms)
+            else:
+                folded += [term for _, _, term in terms]
+
+        return folded + others
+
+    @classmethod
+    def _fold_or(cls, name, terms):
+        values, ranges, rest = [], [], []
+        for op, value, term in terms:
+            if op is None and not isinstance(value, (dict, list)):
+                values.append(value)
+            elif op == 'in' and isinstance(value, list):
+                values.extend(value)
+            elif op == 'range' and len(value) == 2 and \
+                    all(cls._is_number(v) for v in value):
+                ranges.append(sorted(value))
+            else:
+                rest.append(term)
+
+        folded = []
+        if len(values) == 1:
+            folded.append((name, values[0]))
+        elif values:
+            folded.append((name + '__in', cls._sorted_values(values)))
+
+        merged = []
+        for start, stop in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        folded += [(name + '__range', r) for r in merged]
+
+        return folded + rest
+
+    @classmethod
+    def _fold_and(cls, name, terms):
+        in_values, lower, upper, rest = None, None, None, []
+        bound_terms = []
+        for op, value, term in terms:
+            if op == 'in' and isinstance(value, list):
+                value = cls._sorted_values(value)
+                in_values = value if in_values is None else \
+                    [v for v in in_values if v in value]
+            elif op in cls._BOUND_OPERATORS:
+                if op == 'range':
+                    bounds = sorted(value) if len(value) == 2 else []
+                    bounds = [('gte', bounds[0]), ('lte', bounds[1])] \
+                        if bounds else []
+                else:
+                    bounds = [(op, value)]
+
+                if not all(cls._is_number(v) for _, v in bounds):
+                    rest.append(term)
+                    continue
+
+                bound_terms.append(term)
+                for op, value in bounds:
+                    # Bounds are (value, inclusive)
+                    if op in ('gt', 'gte'):
+                        bound = (value, op == 'gte')
+                        if lower is None or bound[0] > lower[0] or \
+                                (bound[0] == lower[0] and not bound[1]):
+                            lower = bound
+                    else:
+                        bound = (value, op == 'lte')
+                        if upper is None or bound[0] < upper[0] or \
+                                (bound[0] == upper[0] and not bound[1]):
+                            upper = bound
+            else:
+                rest.append(term)
+
+        folded = []
+        if in_values is not None:
+            folded.append((name + '__in', in_values))
+
+        if len(bound_terms) == 1:
+            # Nothing to merge, keep the original term
+            folded += bound_terms
+        elif lower and upper and lower[1] and upper[1] and \
+                lower[0] <= upper[0]:
+            folded.append((name + '__range', [lower[0], upper[0]]))
         else:
-            self_filters = self.filters
+            if lower:
+                folded.append((name + ('__gte' if lower[1] else '__gt'), lower[0]))
+            if upper:
+                folded.append((name + ('__lte' if upper[1] else '__lt'), upper[0]))
 
-        if len(self.filters) == 0:
-            # no change
-            f.filters = []
-        elif (len(self.filters) == 1 and
-              isinstance(self.filters[0], dict) and
-              self.filters[0].get('not', {})):
-            # if the filters are already a single dictionary containing a 'not'
-            # then swap out the 'not'
-            f.filters = [self_filters[0]['not']]
+        return folded + rest
+
+    def compile(self):
+        """
+        Compiles the filter into a predicate function that
+        returns True for the records (dicts) that match the filter,
+        so that filters can be evaluated locally (for example on
+        materialized or exported query results).
+
+        Supports exact terms, `__in`, `__range`, `__between`, `__gt`,
+        `__gte`, `__lt` and `__lte` terms combined with and/or/not.
+        Nested fields can be accessed with dots (e.g.
+        "genomic_coordinates.start"). As for the API, a term on a list
+        field matches if any of the values in the list match.
+        """
+        if self._node is None:
+            return lambda record: True
+        return self._compile(self.filters[0])
+
+    def apply(self, records):
+        """Yields the records that match the filter."""
+        predicate = self.compile()
+        for record in records:
+            if predicate(record):
+                yield record
+
+    @staticmethod
+    def _get_field(record, path):
+        value = record
+        for key in path:
+            if isinstance(value, list):
+                value = [v.get(key) if isinstance(v, Mapping) else None
+                         for v in value]
+            elif isinstance(value, Mapping):
+                value = value.get(key)
+            else:
+                return None
+        return value
+
+    _COMPARISONS = {
+        'gt': operator.gt,
+        'gte': operator.ge,
+        'lt': operator.lt,
+        'lte': operator.le,
+    }
+
+    @classmethod
+    def _value_test(cls, op, value):
+        """Returns a function that tests a single (non-list) value"""
+        if op is None:
+            return lambda v: v == value
+        if op == 'in':
+            try:
+                values = frozenset(value)
+            except TypeError:
+                values = list(value)
+
+            def _in(v):
+                try:
+                    return v in values
+                except TypeError:
+                    return False
+
+            return _in
+
+        if op == 'range':
+            def test(v):
+                return value[0] <= v <= value[1]
+        elif op == 'between':
+            def test(v):
+                return value[0] < v < value[1]
         else:
-            # length of self.filters should never be more than 1
-            # 'not' blocks can contain only dicts or a single tuple filter
-            # so we get the first element from the filter list
-            f.filters = [{'not': self_filters[0]}]
+            compare = cls._COMPARISONS[op]
 
-        return f
+            def test(v):
+                return compare(v, value)
+
+        def _compare(v):
+            if v is None:
+                return False
+            try:
+                return test(v)
+            except TypeError:
+                return False
+
+        return _compare
+
+    @classmethod
+    def _compile(cls, flt):
+        if cls._is_term(flt):
+            name, op = cls._split_field(flt[0])
+            path = name.split('.')
+            test = cls._value_test(op, flt[1])
+
+            def _term(record):
+                value = cls._get_field(record, path)
+                if isinstance(value, list):
+                    return any(test(v) for v in value) if value else test(None)
+                return test(value)
+
+            return _term
+
+        if isinstance(flt, dict) and len(flt) == 1:
+            conn, value = list(flt.items())[0]
+            if conn == 'not':
+                predicate = cls._compile(value)
+                return lambda record: not predicate(record)
+            if conn in ('and', 'or') and isinstance(value, list):
+                predicates = [cls._compile(v) for v in value]
+                if conn == 'and':
+                    return lambda record: all(p(record) for p in predicates)
+                return lambda record: any(p(record) for p in predicates)
+
+        raise ValueError('Filter cannot be evaluated locally: {0}'.format(flt))
+
+    def mask(self, columns):
+        """
+        Evaluates the filter on columnar data, provided as a dict of
+        field names (e.g. "genomic_coordinates.start") to NumPy arrays
+        (or lists) of equal length. Returns a boolean NumPy array.
+
+        Requires NumPy.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError('Filter.mask() requires NumPy.\n'
+                              'To install, type: \'pip install numpy\'')
+
+        columns = dict((k, np.asarray(v)) for k, v in columns.items())
+        size = len(next(iter(columns.values()))) if columns else 0
+        if self._node is None:
+            return np.ones(size, dtype=bool)
+        return self._mask(np, self.filters[0], columns, size)
+
+    @classmethod
+    def _mask(cls, np, flt, columns, size):
+        if cls._is_term(flt):
+            name, op = cls._split_field(flt[0])
+            column = columns.get(name)
+            if column is None:
+                column = np.empty(size, dtype=object)
+            return cls._term_mask(np, op, flt[1], column)
+
+        if isinstance(flt, dict) and len(flt) == 1:
+            conn, value = list(flt.items())[0]
+            if conn == 'not':
+                return ~cls._mask(np, value, columns, size)
+            if conn in ('and', 'or') and isinstance(value, list):
+                masks = [cls._mask(np, v, columns, size) for v in value]
+                if not masks:
+                    return np.full(size, conn == 'and', dtype=bool)
+                if conn == 'and':
+                    return np.logical_and.reduce(masks)
+                return np.logical_or.reduce(masks)
+
+        raise ValueError('Filter cannot be evaluated locally: {0}'.format(flt))
+
+    @classmethod
+    def _term_mask(cls, np, op, value, column):
+        if column.dtype.kind in 'biuf' and \
+                (op in ('in', 'range', 'between') or cls._is_number(value)):
+            with np.errstate(invalid='ignore'):
+                if op is None:
+                    return column == value
+                if op == 'in':
+                    return np.isin(column, [v for v in value
+                                            if cls._is_number(v)])
+                if op == 'range':
+                    return (column >= value[0]) & (column <= value[1])
+                if op == 'between':
+                    return (column > value[0]) & (column < value[1])
+                if op == 'gt':
+                    return column > value
+                if op == 'gte':
+                    return column >= value
+                if op == 'lt':
+                    return column < value
+                return column <= value
+
+        # Fall back to testing values one by one
+        # (i.e. for object arrays, strings or lists)
+        test = cls._value_test(op, value)
+
+        def _test(v):
+            if isinstance(v, list):
+                return any(test(i) for i in v) if v else test(None)
+            return test(v)
+
+        return np.fromiter((_test(v) for v in column), dtype=bool,
+                           count=len(column))
 
 
 class GenomicFilter(Filter):
@@ -157,11 +611,11 @@ class GenomicFilter(Filter):
     FIELD_STOP = 'genomic_coordinates.stop'
     FIELD_CHR = 'genomic_coordinates.chromosome'
 
-    @classmethod
-    def from_string(cls, string, exact=False):
-        """
-        Handles UCSC-style range queries (chr1:100-200)
-        """
+    # UCSC-style regions (chr1:100-200 or chr1:100)
+    REGION_PATTERN = re.compile(r'^[^:\s]+:[\d,]+(-[\d,]+)?$')
+
+    @staticmethod
+    def _parse_string(string):
         try:
             chromosome, pos = string.split(':')
         except ValueError:
@@ -172,8 +626,144 @@ class GenomicFilter(Filter):
         else:
             start = stop = pos.replace(',', '')
 
+        return chromosome, start, stop
+
+    @classmethod
+    def from_string(cls, string, exact=False):
+        """
+        Handles UCSC-style range queries (chr1:100-200)
+        """
+        chromosome, start, stop = cls._parse_string(string)
         return cls(chromosome, start, stop, exact=exact)
 
+    @staticmethod
+    def _read_bed(path):
+        """
+        Yields (chromosome, start, stop) from a BED file,
+        converting the 0-based, half-open BED intervals to
+        1-based, closed intervals.
+        """
+        if path.endswith('.gz'):
+            f = gzip.open(path, 'rt') if six.PY3 else gzip.open(path, 'r')
+        else:
+            f = open(path, 'r')
+
+        with f:
+            for line in f:
+                fields = line.split()
+                if not fields or fields[0].startswith(('#', 'track', 'browser')):
+                    continue
+                yield fields[0], int(fields[1]) + 1, int(fields[2])
+
+    @staticmethod
+    def _chromosome_key(chromosome):
+        # Sort chromosomes naturally (2 before 10, X and Y last)
+        if chromosome.isdigit():
+            return (0, int(chromosome), '')
+        return (1, 0, chromosome)
+
+    @classmethod
+    def from_regions(cls, regions, exact=False):
+        """
+        Creates a single filter matching any of the provided regions.
+
+        Regions can be provided as the path to a BED file
+        (optionally gzipped), a single UCSC-style string
+        ("chr1:100-200"), or an iterable of UCSC-style strings
+        and/or (chromosome, start[, stop]) tuples.
+
+        The regions are sorted and overlapping (or adjacent) regions
+        are merged per chromosome, so that a compact filter is sent
+        for large panels. With `exact`, only duplicate regions are
+        removed. Use `split()` to divide the resulting filter into
+        several smaller filters (i.e. to run parallel sub-queries).
+
+        Raises a ValueError if there are no regions, since the filter
+        would otherwise match the whole dataset.
+        """
+        if isinstance(regions, six.string_types):
+            if os.path.exists(regions):
+                regions = cls._read_bed(regions)
+            elif cls.REGION_PATTERN.match(regions):
+                regions = [regions]
+            else:
+                raise ValueError(
+                    '"{0}" is neither a BED file nor a UCSC-style region '
+                    '(i.e. "chr1:100-200")'.format(regions))
+
+        by_chromosome = {}
+        for region in regions:
+            if isinstance(region, six.string_types):
+                region = cls._parse_string(region)
+
+            chromosome, start = region[0], int(region[1])
+            stop = int(region[2]) if len(region) > 2 and region[2] is not None \
+                else start
+            chromosome = str(chromosome).replace('chr', '')
+            by_chromosome.setdefault(chromosome, set()).add((start, stop))
+
+        if not by_chromosome:
+            raise ValueError('At least one region is required')
+
+        merged = []
+        for chromosome in sorted(by_chromosome, key=cls._chromosome_key):
+            intervals = sorted(by_chromosome[chromosome])
+            if exact:
+                merged += [(chromosome, start, stop) for start, stop in intervals]
+                continue
+
+            current_start, current_stop = intervals[0]
+            for start, stop in intervals[1:]:
+                if start <= current_stop + 1:
+                    current_stop = max(current_stop, stop)
+                else:
+                    merged.append((chromosome, current_start, current_stop))
+                    current_start, current_stop = start, stop
+            merged.append((chromosome, current_start, current_stop))
+
+        return cls._from_merged_regions(merged, exact)
+
+    @classmethod
+    def _from_merged_regions(cls, regions, exact):
+        """Builds the filter from sorted and merged regions"""
+        by_chromosome = collections.OrderedDict()
+        for chromosome, start, stop in regions:
+            if exact:
+                f = {'and': [(cls.FIELD_START, start), (cls.FIELD_STOP, stop)]}
+            else:
+                # Matches any record that overlaps with the region
+                f = {'and': [(cls.FIELD_START + '__lte', stop),
+                             (cls.FIELD_STOP + '__gte', start)]}
+            by_chromosome.setdefault(chromosome, []).append(f)
+
+        filters = []
+        for chromosome, region_filters in by_chromosome.items():
+            if len(region_filters) > 1:
+                region_filters = [{'or': region_filters}]
+            filters.append(
+                {'and': [(cls.FIELD_CHR, chromosome)] + region_filters})
+
+        f = cls.__new__(cls)
+        f.regions = regions
+        f.exact = exact
+        if len(filters) > 1:
+            f.filters = [{'or': filters}]
+        else:
+            f.filters = filters
+        return f
+
+    def split(self, max_regions):
+        """
+        Splits a filter created by `from_regions` into
+        several filters of at most `max_regions` regions each.
+        """
+        if not hasattr(self, 'regions'):
+            return [self]
+
+        return [self._from_merged_regions(self.regions[i:i + max_regions],
+                                          self.exact)
+                for i in range(0, len(self.regions), max_regions)]
+
     def __init__(self, chromosome, start, stop=None, exact=False):
         """
         This class supports single position and range filters.
@@ -213,12 +803,103 @@ class GenomicFilter(Filter):
         else:
             f = f & \
                 Filter(**{self.FIELD_CHR: str(chromosome).replace('chr', '')})
-        self.filters = f.filters
+        self._node = f._node
+        self._filters = None
 
     def __repr__(self):
         return '<GenomicFilter {0}>'.format(self.filters)
 
 
+class _FieldTable(object):
+    """An interned, ordered table of record field names."""
+    __slots__ = ('fields', 'index', '__weakref__')
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.index = dict((f, i) for i, f in enumerate(fields))
+
+
+class CompactRecord(Mapping):
+    """
+    A memory-efficient, read-only query result record.
+
+    Field names are stored once in a table that is shared by
+    all records with the same fields, and values are stored in a tuple.
+    Nested objects are also converted to CompactRecords.
+
+    Use it as the `result_class` of a Query:
+
+        dataset.query(result_class=CompactRecord)
+
+    Records support the read-only mapping interface (``record['field']``,
+    ``get()``, ``keys()``, ``items()``, etc.). Records can be sent back
+    to the API as they are (i.e. with Annotator.annotate or
+    DatasetImport.create_from_records). Use ``to_dict()`` to get a plain
+    dict, or ``json.dumps(record, default=json_default)`` (from
+    solvebio.utils.jsonutils) to serialize them.
+    """
+    __slots__ = ('_table', '_values')
+
+    # Short string values are interned, so that repeated values
+    # (i.e. gene symbols, chromosomes) are only stored once.
+    INTERN_MAX_LENGTH = 64
+
+    _tables = weakref.WeakValueDictionary()
+
+    def __init__(self, record=()):
+        if not isinstance(record, dict):
+            record = dict(record)
+        fields = tuple(record)
+        table = self._tables.get(fields)
+        if table is None:
+            table = self._tables.setdefault(fields, _FieldTable(fields))
+
+        self._table = table
+        self._values = tuple([self._compact(v) for v in record.values()])
+
+    @classmethod
+    def _compact(cls, value):
+        if type(value) is str:
+            if len(value) <= cls.INTERN_MAX_LENGTH:
+                return intern(value)
+        elif isinstance(value, dict):
+            return cls(value)
+        elif isinstance(value, list):
+            return [cls._compact(v) for v in value]
+        return value
+
+    @classmethod
+    def _expand(cls, value):
+        if isinstance(value, CompactRecord):
+            return value.to_dict()
+        if isinstance(value, list):
+            return [cls._expand(v) for v in value]
+        return value
+
+    def __getitem__(self, key):
+        return self._values[self._table.index[key]]
+
+    def __contains__(self, key):
+        return key in self._table.index
+
+    def __iter__(self):
+        return iter(self._table.fields)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __reduce__(self):
+        return (self.__class__, (self.to_dict(),))
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.to_dict())
+
+    def to_dict(self):
+        """Returns the record as a plain dict (recursively)."""
+        return dict((f, self._expand(v))
+                    for f, v in zip(self._table.fields, self._values))
+
+
 class Query(object):
     """
     A Query API request wrapper that generates a request from Filter objects,
@@ -256,7 +937,9 @@ class Query(object):
           - `dataset_id`: Unique ID of dataset to query.
           - `query` (optional): An optional query string.
           - `genome_build`: The genome build to use for the query.
-          - `result_class` (optional): Class of object returned by query.
+          - `result_class` (optional): Class of object returned by query
+            (use `CompactRecord` to reduce memory usage). It is called
+            with each result (a dict) of each page.
           - `fields` (optional): List of specific fields to retrieve.
           - `exclude_fields` (optional): List of specific fields to exclude.
           - `entities` (optional): List of entity tuples to filter on.
@@ -384,6 +1067,43 @@ class Query(object):
         return self._clone(
             filters=[GenomicFilter(chromosome, position, exact=exact)])
 
+    def regions(self, regions, exact=False):
+        """
+        Shortcut to filter on many regions on genomic datasets
+        (see `GenomicFilter.from_regions`).
+        """
+        return self._clone(
+            filters=[GenomicFilter.from_regions(regions, exact=exact)])
+
+    def iter_regions(self, regions, exact=False, max_regions=1000,
+                     concurrency=DEFAULT_WORKERS):
+        """
+        Like `regions`, but splits very large panels into sub-queries
+        of at most `max_regions` regions which are run concurrently.
+        Results are yielded in the order of the regions, records that
+        overlap with several sub-queries are only returned once.
+        """
+        f = GenomicFilter.from_regions(regions, exact=exact)
+        queries = [self._clone(filters=[sub_filter])
+                   for sub_filter in f.split(max_regions)]
+
+        def _fetch(query):
+            return list(query)
+
+        seen = set()
+        n_results = 0
+        for results in imap_ordered(_fetch, queries, workers=concurrency,
+                                    max_pending=concurrency):
+            for record in results:
+                if n_results >= self._limit:
+                    return
+                if '_id' in record:
+                    if record['_id'] in seen:
+                        continue
+                    seen.add(record['_id'])
+                n_results += 1
+                yield record
+
     def count(self):
         """
         Returns the total number of results returned by a query.
@@ -673,7 +1393,8 @@ class Query(object):
         Executes a query. Additional query parameters can be passed
         as keyword arguments.
 
-        Returns: The request parameters and the raw query response.
+        Returns: The request parameters and the raw query response,
+        where the results are instances of `result_class`.
         """
         _params = self._build_query(**query)
         self._page_offset = offset
@@ -695,8 +1416,34 @@ class Query(object):
 
         logger.debug('query response took: %(took)d ms, total: %(total)d'
                      % self._response)
+
+        if self._result_class is not dict:
+            self._response['results'] = [
+                self._result_class(r) for r in self._response['results']]
+
         return _params, self._response
 
+    def fingerprint(self, scalar_fields=()):
+        """
+        Returns a stable hash of the query parameters, where the filters
+        are normalized (see `Filter.normalize`, and `scalar_fields`).
+        Logically equivalent queries (i.e. with filters in a different
+        order, or duplicated filters) have the same fingerprint.
+        """
+        params = self._build_query()
+        params.pop('filters', None)
+        f = Filter()
+        f.filters = Query._process_filters(self._filters)
+        params['filters'] = f.normalize(scalar_fields).filters
+        params['dataset'] = self._dataset_id
+        if self._limit < float('inf'):
+            params['limit'] = self._limit
+        if self._slice:
+            params['slice'] = [self._slice.start, self._slice.stop]
+
+        return hashlib.sha1(
+            Filter._canonical(params).encode('utf-8')).hexdigest()
+
     def fields(self):
         """Returns all expected fields that will be found in the results."""
 
@@ -710,6 +1457,36 @@ class Query(object):
 
         return fields
 
+    def materialize(self, path=None):
+        """
+        Fetches the query results once and stores them in a local,
+        memory-mapped record file. The returned RecordFile can be
+        iterated over repeatedly and indexed (i.e. ``records[1000]``)
+        without any additional API requests.
+
+        If no path is provided, a temporary file is used and it is
+        removed when the RecordFile is closed. An existing file
+        at the provided path is overwritten.
+        """
+        from .utils.recordfile import RecordFile
+
+        if path and os.path.exists(path):
+            os.remove(path)
+
+        # Store plain dicts, the result_class is applied when reading.
+        q = self._clone()
+        q._slice = self._slice
+        q._result_class = dict
+
+        records = RecordFile(path, result_class=self._result_class)
+        try:
+            records.extend(q)
+        except:
+            records.close()
+            raise
+
+        return records
+
     def export(self, format='json', follow=True, limit=None, **kwargs):
         from solvebio import DatasetExport
 
@@ -817,7 +1594,8 @@ class Query(object):
             This is a limited join in that it will only select
             one record in dataset B to join for each key.
             i.e. If multiple records in dataset B have the same key,
-            only ONE will be retrieved.
+            only ONE will be retrieved. Use `hash_join` for
+            one-to-many joins (and much larger joins).
 
         """
 
@@ -901,43 +1679,238 @@ class Query(object):
 
         return new_query
 
+    def hash_join(self, query_b, key, key_b=None, prefix="b_", always_prefix=True,
+                  keys_per_query=500, concurrency=DEFAULT_WORKERS):
+        """Performs a client-side left outer join between the current
+        query (query A) and another query (query B), yielding the
+        joined records.
+
+        Query A is streamed in batches of records with up to
+        `keys_per_query` * `concurrency` distinct keys. The keys of each
+        batch are split into up to `concurrency` chunks of at most
+        `keys_per_query` keys, and the matching records of B are fetched
+        with parallel "<key_b>__in" queries, then merged locally using a
+        hash table. The next records of A are fetched while the queries
+        of B are running.
+
+        Unlike `join`, all matching records in B are joined: a record
+        in A with N matches yields N joined records. Records in A
+        without a match are yielded unchanged. If the key of a record
+        in A is a list, each value of the list is matched.
+
+        Set prefix to None to use a random prefix.
+        Disable always_prefix to only prefix fields of B that are
+        already present in the record of A.
+        """
+        if not prefix:
+            prefix = str(uuid.uuid4())[:8] + '_'
+
+        # If no key_b is provided, use the same key as for A
+        key_b = key_b or key
+
+        query_a = self._clone()
+        query_a._slice = self._slice
+        query_a._result_class = dict
+
+        def _keys(record, field):
+            value = record
+            for part in field.split('.'):
+                if not isinstance(value, dict):
+                    return []
+                value = value.get(part)
+
+            values = value if isinstance(value, list) else [value]
+            return [v for v in values
+                    if v is not None and not isinstance(v, (dict, list))]
+
+        def _fetch(keys):
+            q = query_b._clone(filters=[Filter(**{key_b + '__in': keys})])
+            q._result_class = dict
+            return list(q)
+
+        def _merge(record, match):
+            joined = dict(record)
+            for field, value in six.iteritems(match):
+                if always_prefix or field in record:
+                    field = prefix + field
+                joined[field] = value
+            return joined
+
+        # Number of distinct keys (and records of A) per batch
+        workers = max(concurrency or 1, 1)
+        batch_keys = keys_per_query * workers
+        batch_records = max(batch_keys, query_a._page_size)
+
+        def _batches():
+            records, keys, seen = [], [], set()
+            for record in query_a:
+                records.append(record)
+                for k in _keys(record, key):
+                    if k not in seen:
+                        seen.add(k)
+                        keys.append(k)
+
+                if len(keys) >= batch_keys or len(records) >= batch_records:
+                    yield records, keys
+                    records, keys, seen = [], [], set()
+            if records:
+                yield records, keys
+
+        def _lookups():
+            # Queries of B for each batch, the last one with the records
+            for records, keys in _batches():
+                # Split small batches between the workers too
+                size = max(min(keys_per_query,
+                               (len(keys) + workers - 1) // workers), 1)
+                chunks = [keys[i:i + size]
+                          for i in range(0, len(keys), size)] or [[]]
+                for i, chunk in enumerate(chunks):
+                    yield chunk, records if i == len(chunks) - 1 else None
+
+        def _lookup(item):
+            chunk, records = item
+            return (_fetch(chunk) if chunk else []), records
+
+        table = {}
+        for matches, records in imap_ordered(_lookup, _lookups(),
+                                             workers=concurrency):
+            for match in matches:
+                for k in _keys(match, key_b):
+                    table.setdefault(k, []).append(match)
+
+            if records is None:
+                continue
+
+            for record in records:
+                matched = False
+                for k in _keys(record, key):
+                    for match in table.get(k, []):
+                        matched = True
+                        joined = _merge(record, match)
+                        if self._result_class is not dict:
+                            joined = self._result_class(joined)
+                        yield joined
+
+                if not matched:
+                    if self._result_class is not dict:
+                        record = self._result_class(record)
+                    yield record
+
+            table = {}
+
 
 class BatchQuery(object):
     """
     BatchQuery accepts a list of Query objects and executes them
-    in a single request to /v2/batch_query.
+    in requests to /v2/batch_query. Large lists of queries are split
+    into batches of `batch_size` queries, which are sent concurrently.
     """
+    # The maximum number of queries sent in one request.
+    BATCH_SIZE = 100
+
     # Allows pre-setting a SolveClient
     _client = None
 
     def __init__(self, queries, **kwargs):
         """
         Expects a list of Query objects.
+
+        :Parameters:
+          - `batch_size` (optional): Maximum number of queries per request.
+          - `concurrency` (optional): Number of batch requests to run at once.
         """
         if not isinstance(queries, list):
             queries = [queries]
 
         self._queries = queries
+        self._batch_size = int(kwargs.get('batch_size') or self.BATCH_SIZE)
+        self._concurrency = kwargs.get('concurrency', DEFAULT_WORKERS)
         self._client = kwargs.get('client') or self._client or client
 
-    def _build_query(self):
+        if self._batch_size <= 0:
+            raise Exception('\'batch_size\' parameter must be > 0')
+
+    def _build_query(self, pages=None):
+        """
+        Builds the batch request for a list of (query, offset, limit)
+        pages. By default, the first page of each query is requested.
+        """
         query = {'queries': []}
 
-        for i in self._queries:
+        if pages is None:
+            pages = [(i, i._page_offset or 0, min(i._page_size, i._limit))
+                     for i in self._queries]
+
+        for i, offset, limit in pages:
             _params = i._build_query(
                 dataset=i._dataset_id,
-                offset=i._page_offset or 0,
-                limit=min(
-                    i._page_size,
-                    i._limit
-                ),
+                offset=offset,
+                limit=limit,
             )
             query['queries'].append(_params)
 
         return query
 
-    def execute(self, **params):
-        _params = self._build_query()
-        _params.update(**params)
-        response = self._client.post('/v2/batch_query', _params)
-        return response
+    def _execute_pages(self, pages, **params):
+        def _execute_batch(batch):
+            _params = self._build_query(batch)
+            _params.update(**params)
+            return self._client.post('/v2/batch_query', _params)
+
+        batches = [pages[i:i + self._batch_size]
+                   for i in range(0, len(pages), self._batch_size)]
+
+        responses = []
+        for response in imap_ordered(_execute_batch, batches,
+                                     workers=self._concurrency):
+            responses.extend(response)
+        return responses
+
+    def execute(self, all_pages=False, **params):
+        """
+        Executes the queries and returns the list of responses,
+        in the same order as the queries.
+
+        By default only the first page of each query is retrieved.
+        Set `all_pages` to fetch all the results of each query
+        (up to its limit): subsequent pages of all queries are batched
+        together until every query is exhausted.
+        """
+        pages = [(i, i._page_offset or 0, min(i._page_size, i._limit))
+                 for i in self._queries]
+        responses = self._execute_pages(pages, **params)
+        if not all_pages:
+            return responses
+
+        def _next_page(i):
+            query, response = self._queries[i], responses[i]
+            # Skip failed queries
+            if 'results' not in response:
+                return None
+
+            start = query._page_offset or 0
+            wanted = min(response['total'], start + query._limit) - start
+            fetched = len(response['results'])
+            if fetched >= wanted:
+                return None
+            return (query, start + fetched, min(query._page_size, wanted - fetched))
+
+        pending = list(range(len(responses)))
+        while pending:
+            pages = [(i, _next_page(i)) for i in pending]
+            pages = [(i, page) for i, page in pages if page]
+            if not pages:
+                break
+
+            page_responses = self._execute_pages([p for _, p in pages], **params)
+            pending = []
+            for (i, _), response in zip(pages, page_responses):
+                if not response.get('results'):
+                    # Stop paginating on errors or unexpected empty pages
+                    logger.warning('batch query {0} stopped paginating: {1}'
+                                   .format(i, response))
+                    continue
+                responses[i]['results'].extend(response['results'])
+                pending.append(i)
+
+        return responses
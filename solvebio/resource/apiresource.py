@@ -3,9 +3,14 @@ from __future__ import absolute_import
 import six
 from six.moves import zip
 from six.moves.urllib.parse import unquote
+from six.moves.urllib.parse import parse_qs
+from six.moves.urllib.parse import urlencode
+from six.moves.urllib.parse import urlparse
+from six.moves.urllib.parse import urlunparse
 from six.moves import input as raw_input
 
 import os
+import math
 import requests
 import tempfile
 
@@ -17,6 +22,8 @@ except ImportError:
 from ..client import client, _handle_api_error, _handle_request_error
 from ..utils.tabulate import tabulate
 from ..utils.printing import pager
+from ..utils.concurrency import DEFAULT_WORKERS
+from ..utils.concurrency import imap_ordered
 # from solvebio.errors import NotFoundError
 from ..errors import NotFoundError
 
@@ -91,6 +98,71 @@ class ListObject(SolveObject):
     def solve_objects(self):
         return convert_to_solve_object(self['data'], client=self._client)
 
+    def _remaining_page_urls(self):
+        """
+        Returns the URLs of all pages after the current one, computed
+        from the "next" link and the total, or None if they cannot be
+        computed (i.e. the API does not paginate by page number).
+        """
+        next_url = self['links']['next']
+        if not next_url:
+            return []
+
+        parsed = urlparse(next_url)
+        query = parse_qs(parsed.query)
+        if 'page' not in query:
+            return None
+
+        next_page = int(query['page'][0])
+        try:
+            page_size = int(query['limit'][0])
+        except (KeyError, ValueError):
+            page_size = len(self['data'])
+        if not page_size:
+            return None
+
+        last_page = int(math.ceil(self['total'] / float(page_size)))
+        urls = []
+        for page in range(next_page, last_page + 1):
+            query['page'] = [str(page)]
+            urls.append(urlunparse(
+                parsed._replace(query=urlencode(query, doseq=True))))
+        return urls
+
+    def iterate(self, workers=DEFAULT_WORKERS):
+        """
+        Yields every item from the current page onwards, in order.
+
+        The remaining pages are fetched concurrently
+        using up to `workers` parallel requests.
+        """
+        urls = self._remaining_page_urls()
+        if urls is None or workers <= 1:
+            # Fall back to following the "next" links one at a time
+            page = self
+            while page is not None:
+                for obj in page['data']:
+                    yield convert_to_solve_object(obj, client=self._client)
+                page = page.next_page()
+            return
+
+        for obj in self['data']:
+            yield convert_to_solve_object(obj, client=self._client)
+
+        def _fetch(url):
+            return self._client.get(url, {})['data']
+
+        for data in imap_ordered(_fetch, urls, workers=workers):
+            for obj in data:
+                yield convert_to_solve_object(obj, client=self._client)
+
+    def to_list(self, workers=DEFAULT_WORKERS):
+        """
+        Returns a list of all items from the current page onwards,
+        fetching the remaining pages concurrently.
+        """
+        return list(self.iterate(workers=workers))
+
     def set_tabulate(self, fields, **kwargs):
         self._tabulate = lambda data:\
             tabulate([[d[i] for i in fields] for d in data], **kwargs)
@@ -111,6 +183,11 @@ class ListObject(SolveObject):
         if self._first_page_url != self['url']:
             self.refresh_from(self.first_page())
 
+        # Lists created with all(workers=N) fetch pages concurrently
+        workers = getattr(self, '_workers', None)
+        if workers and workers > 1:
+            return self.iterate(workers=workers)
+
         return self
 
     def __next__(self):
@@ -240,10 +317,19 @@ class ListableAPIResource(APIResource):
 
     @classmethod
     def all(cls, **params):
+        """
+        Lists all items in a class that you have access to.
+
+        Pass `workers` to iterate over the results by fetching
+        the remaining pages concurrently.
+        """
         _client = params.pop('client', None) or cls._client or client
+        workers = params.pop('workers', None)
         url = cls.class_url()
         response = _client.get(url, params)
         results = convert_to_solve_object(response, client=_client)
+        if workers:
+            results._workers = workers
 
         # If the object has LIST_FIELDS, setup tabulate
         if len(results.data) > 0:
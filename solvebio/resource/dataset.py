@@ -1,8 +1,19 @@
 import os
-import time
+import json
+import gzip
+import uuid
+import shutil
+import tempfile
+
+import six
+from six.moves.urllib.parse import quote
+from six.moves.urllib.parse import urljoin
 
 from ..client import client
 from ..query import Query
+from ..utils.concurrency import DEFAULT_WORKERS
+from ..utils.concurrency import imap_ordered
+from ..utils.jsonutils import json_default
 
 from .solveobject import convert_to_solve_object
 from .apiresource import CreateableAPIResource
@@ -26,6 +37,13 @@ class Dataset(CreateableAPIResource,
     """
     RESOURCE_VERSION = 2
 
+    # Lookup IDs are split into requests with URLs (including the API
+    # host and the percent-encoded IDs) up to this length.
+    LOOKUP_URL_MAX_LENGTH = 2000
+
+    # Number of records per uploaded file in import_records(compress=True)
+    IMPORT_FILE_CHUNK_SIZE = 100000
+
     LIST_FIELDS = (
         ('id', 'ID'),
         ('vault_name', 'Vault'),
@@ -169,9 +187,68 @@ class Dataset(CreateableAPIResource,
         self._data_url()  # raises an exception if there's no ID
         return Query(self['id'], query=query, client=self._client, **params)
 
-    def lookup(self, *sbids):
-        lookup_url = self._data_url() + '/' + ','.join(sbids)
-        return self._client.get(lookup_url, {})['results']
+    def lookup(self, *sbids, **kwargs):
+        """
+        Retrieves records by SolveBio ID (the "_id" field).
+        IDs can be provided as arguments and/or as iterables of IDs.
+
+        The IDs are deduplicated and split into requests that fit within
+        the URL length limit, which are made concurrently. Records are
+        returned in the order of their (first) ID in the input.
+        IDs that are not found are skipped.
+
+        :Parameters:
+          - `stream` (optional): Return a generator that consumes the
+            IDs lazily and yields records as they are retrieved.
+          - `concurrency` (optional): Number of lookup requests to
+            run at once (default: 4).
+        """
+        stream = kwargs.pop('stream', False)
+        concurrency = kwargs.pop('concurrency', DEFAULT_WORKERS)
+        base_url = self._data_url() + '/'
+        # The client adds the API host to the URL
+        full_url = urljoin(getattr(self._client, '_host', ''), base_url)
+
+        def _ids():
+            seen = set()
+            for arg in sbids:
+                if isinstance(arg, six.string_types):
+                    arg = [arg]
+                for sbid in arg:
+                    if sbid not in seen:
+                        seen.add(sbid)
+                        yield sbid
+
+        def _chunks():
+            # Chunks of (ID, encoded ID)
+            chunk, length = [], len(full_url) - 1
+            for sbid in _ids():
+                encoded = quote(sbid, safe='')
+                if chunk and length + len(encoded) + 1 > self.LOOKUP_URL_MAX_LENGTH:
+                    yield chunk
+                    chunk, length = [], len(full_url) - 1
+                chunk.append((sbid, encoded))
+                length += len(encoded) + 1
+            if chunk:
+                yield chunk
+
+        def _lookup(chunk):
+            url = base_url + ','.join(encoded for _, encoded in chunk)
+            results = self._client.get(url, {})['results']
+            by_id = dict((r.get('_id'), r) for r in results)
+            if None in by_id:
+                # Records without IDs cannot be re-ordered
+                return results
+            return [by_id[sbid] for sbid, _ in chunk if sbid in by_id]
+
+        def _stream():
+            for results in imap_ordered(_lookup, _chunks(), workers=concurrency):
+                for record in results:
+                    yield record
+
+        if stream:
+            return _stream()
+        return list(_stream())
 
     def _beacon_url(self):
         if 'beacon_url' not in self:
@@ -209,6 +286,105 @@ class Dataset(CreateableAPIResource,
             manifest=manifest.manifest,
             **kwargs)
 
+    def import_records(self, records, chunk_size=None,
+                       concurrency=DEFAULT_WORKERS, compress=False,
+                       follow=True, **kwargs):
+        """
+        Imports records from any iterable (i.e. a generator) into the
+        dataset. Records are serialized and sent in chunks, at most
+        `concurrency` at once, and the iterable is only consumed as
+        chunks are sent, so memory use does not depend on the number
+        of records.
+
+        By default, each chunk of `chunk_size` records (1000) is sent
+        as a separate DatasetImport (with `data_records`).
+
+        With `compress`, each chunk of `chunk_size` records (100000)
+        is written to a gzipped JSON Lines file and uploaded to the
+        Uploads folder of your personal vault, and all the files are
+        imported as a single DatasetImport. Temporary files are removed
+        once uploaded.
+
+        Other kwargs (i.e. commit_mode) are used for the import(s).
+        With `follow` (default), waits for the import(s) to finish.
+        Returns the list of imports.
+        """
+        from . import DatasetImport
+
+        if 'id' not in self or not self['id']:
+            raise Exception(
+                'No Dataset ID found. '
+                'Please instantiate or retrieve a dataset '
+                'with an ID.')
+
+        if not compress:
+            return DatasetImport.create_from_records(
+                self['id'], records,
+                chunk_size=chunk_size or DatasetImport.RECORDS_CHUNK_SIZE,
+                concurrency=concurrency, follow=follow,
+                client=self._client, **kwargs)
+
+        manifest = self._upload_records(
+            records, chunk_size or self.IMPORT_FILE_CHUNK_SIZE, concurrency)
+        imp = DatasetImport.create(
+            dataset_id=self['id'],
+            manifest=manifest,
+            client=self._client,
+            **kwargs)
+
+        if follow:
+            imp.follow()
+
+        return [imp]
+
+    def _upload_records(self, records, chunk_size, concurrency):
+        """
+        Uploads chunks of records as gzipped JSON Lines files,
+        and returns the manifest of the uploaded files.
+        """
+        from solvebio import Object
+        from solvebio import Vault
+        from . import DatasetImport
+
+        vault = Vault.get_personal_vault(client=self._client)
+        upload_path = Vault.get_or_create_uploads_path(client=self._client)
+        prefix = 'records-{0}-{1}'.format(self['id'], uuid.uuid4().hex[:8])
+        tmpdir = tempfile.mkdtemp(prefix='solvebio-')
+
+        def _upload(args):
+            i, chunk = args
+            path = os.path.join(
+                tmpdir, '{0}-{1:05d}.json.gz'.format(prefix, i))
+            with gzip.open(path, 'wb') as f:
+                for record in chunk:
+                    f.write(json.dumps(record, default=json_default)
+                            .encode('utf-8'))
+                    f.write(b'\n')
+
+            try:
+                return Object.upload_file(path, upload_path, vault.full_path,
+                                          client=self._client)
+            finally:
+                os.remove(path)
+
+        try:
+            files = list(imap_ordered(
+                _upload,
+                enumerate(DatasetImport._chunks(records, chunk_size)),
+                workers=concurrency,
+                max_pending=concurrency))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        return {
+            'files': [{
+                'object_id': file_.id,
+                'name': file_.filename,
+                'md5': file_.md5,
+                'size': file_.size,
+            } for file_ in files]
+        }
+
     def export(self, format='json', follow=True, **kwargs):
         if 'id' not in self or not self['id']:
             raise Exception(
@@ -267,8 +443,14 @@ class Dataset(CreateableAPIResource,
 
         Defaults to limit=1 for performance. Increase this value in order
         to return more tasks as output.
+
+        With `follow`, the active tasks are followed together with a
+        TaskMonitor until no active task remains.
         """
+        from .taskmonitor import TaskMonitor
+
         statuses = ['running', 'queued', 'pending']
+        monitor = TaskMonitor(max_sleep=sleep_seconds, client=self._client)
 
         while True:
 
@@ -285,10 +467,8 @@ class Dataset(CreateableAPIResource,
             if not activity or not follow:
                 break
 
-            for task in activity.solve_objects()[0:limit]:
-                task.follow(sleep_seconds=sleep_seconds)
-
-            time.sleep(sleep_seconds)
+            monitor.add(*activity.solve_objects()[0:limit])
+            monitor.wait()
 
         return list(activity)
 
@@ -5,6 +5,8 @@ from .apiresource import UpdateableAPIResource
 from .solveobject import convert_to_solve_object
 from .task import Task
 from .datasetcommit import follow_commits
+from ..utils.concurrency import DEFAULT_WORKERS
+from ..utils.concurrency import imap_ordered
 
 import time
 
@@ -22,6 +24,9 @@ class DatasetImport(CreateableAPIResource, ListableAPIResource,
     """
     RESOURCE_VERSION = 2
 
+    # Number of records sent per import by create_from_records()
+    RECORDS_CHUNK_SIZE = 1000
+
     LIST_FIELDS = (
         ('id', 'ID'),
         ('title', 'Title'),
@@ -34,6 +39,58 @@ class DatasetImport(CreateableAPIResource, ListableAPIResource,
     def dataset(self):
         return convert_to_solve_object(self['dataset'], client=self._client)
 
+    @staticmethod
+    def _chunks(records, chunk_size):
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    @classmethod
+    def create_from_records(cls, dataset_id, records,
+                            chunk_size=RECORDS_CHUNK_SIZE,
+                            concurrency=DEFAULT_WORKERS, follow=False,
+                            sleep_seconds=Task.SLEEP_WAIT_DEFAULT,
+                            **params):
+        """
+        Imports records from any iterable (i.e. a generator or a
+        VCF parser) into a dataset, without holding them all in memory.
+
+        Records are sent in chunks of `chunk_size` records, as one
+        DatasetImport (with `data_records`) per chunk. Up to
+        `concurrency` imports are created at once, and the iterable is
+        only consumed as imports are created, so at most
+        2 * `concurrency` chunks are held in memory at a time.
+        Other parameters (i.e. commit_mode or target_fields) are
+        used for all the imports.
+
+        Returns the list of imports. With `follow`, waits for all the
+        imports (and their commits) to finish, polling them together
+        with a TaskMonitor (at most every `sleep_seconds`).
+        """
+        _client = params.pop('client', None) or cls._client
+
+        def _create(chunk):
+            return cls.create(dataset_id=dataset_id, data_records=chunk,
+                              client=_client, **params)
+
+        imports = list(imap_ordered(_create,
+                                    cls._chunks(records, chunk_size),
+                                    workers=concurrency,
+                                    max_pending=concurrency))
+
+        if follow:
+            from .taskmonitor import TaskMonitor
+            TaskMonitor(imports, max_sleep=sleep_seconds,
+                        client=_client).wait()
+
+        return imports
+
     def follow(self, loop=True, sleep_seconds=Task.SLEEP_WAIT_DEFAULT):
 
         if self.status == 'queued':
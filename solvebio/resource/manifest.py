@@ -4,33 +4,60 @@ from __future__ import print_function
 
 import os
 import glob
+import itertools
 
 from six.moves.urllib.parse import urlparse
 
 import solvebio
 
+from ..utils.concurrency import DEFAULT_WORKERS
+from ..utils.concurrency import imap_ordered
+
 
 class Manifest(object):
     """
     Manifests aren't strictly resources, they represent a list
     of remote files (URLs) with additional information that
     can be used for validation (size and MD5).
+
+    Local files are uploaded to the Uploads folder of your personal
+    vault, which is only looked up once per manifest. Files added
+    together (i.e. with a glob or a directory) are uploaded
+    concurrently, up to `concurrency` at once.
     """
     manifest = None
 
-    def __init__(self):
+    def __init__(self, concurrency=DEFAULT_WORKERS, **kwargs):
         self.manifest = {'files': []}
+        self.concurrency = concurrency
+        self._client = kwargs.get('client')
+        self._upload_folder = None
+
+    @property
+    def upload_folder(self):
+        """The (vault full path, path) of the uploads folder"""
+        if self._upload_folder is None:
+            vault = solvebio.Vault.get_personal_vault(client=self._client)
+            path = solvebio.Vault.get_or_create_uploads_path(
+                client=self._client)
+            self._upload_folder = (vault.full_path, path)
+        return self._upload_folder
+
+    def _upload(self, path, upload_folder=None, **kwargs):
+        """Uploads a file and returns its manifest entry"""
+        vault_full_path, upload_path = upload_folder or self.upload_folder
+        print("Uploading file: {0} to {1}".format(path, upload_path))
+        file_ = solvebio.Object.upload_file(path, upload_path,
+                                            vault_full_path,
+                                            client=self._client)
+        if not file_:
+            # Empty files are not uploaded
+            return None
 
-    def add_file(self, path, **kwargs):
-        default_upload_path = solvebio.Vault.get_or_create_uploads_path()
-        vault = solvebio.Vault.get_personal_vault()
-        print("Uploading file: {0} to {1}".format(path, default_upload_path))
-        file_ = solvebio.Object.upload_file(path, default_upload_path,
-                                            vault.full_path)
         print("Successfuly uploaded file {0} (id:{1} size:{2} md5:{3})"
               .format(path, file_.id, file_.size, file_.md5))
 
-        self.manifest['files'].append({
+        return {
             'object_id': file_.id,
             'name': file_.filename,
             'md5': file_.md5,
@@ -38,7 +65,27 @@ class Manifest(object):
             'reader_params': kwargs.get('reader_params'),
             'entity_params': kwargs.get('entity_params'),
             'validation_params': kwargs.get('validation_params')
-        })
+        }
+
+    def add_file(self, path, **kwargs):
+        entry = self._upload(path, **kwargs)
+        if entry:
+            self.manifest['files'].append(entry)
+
+    def add_files(self, paths, **kwargs):
+        """
+        Uploads files concurrently, and adds them to the manifest
+        (in order) as the uploads finish.
+        """
+        # Resolved before the uploads start, so that the workers
+        # don't race to create the uploads folder.
+        upload_folder = self.upload_folder
+        entries = imap_ordered(
+            lambda path: self._upload(path, upload_folder, **kwargs),
+            paths, workers=self.concurrency)
+        for entry in entries:
+            if entry:
+                self.manifest['files'].append(entry)
 
     def add_url(self, url, **kwargs):
         manifest_item = dict(url=url, **kwargs)
@@ -49,25 +96,30 @@ class Manifest(object):
         Add one or more files or URLs to the manifest.
         If files contains a glob, it is expanded.
 
-        All files are uploaded to SolveBio. The Upload
+        All files are uploaded to SolveBio (concurrently). The Upload
         object is used to fill the manifest.
         """
         def _is_supported_url(path):
             p = urlparse(path)
             return bool(p.scheme) and p.scheme in ['https', 'http']
 
+        # Expand all the paths first, so that all the
+        # files are uploaded concurrently.
+        items = []
         for path in args:
             path = os.path.expanduser(path)
             if _is_supported_url(path):
-                self.add_url(path)
+                items.append((True, path))
             elif os.path.isfile(path):
-                self.add_file(path)
+                items.append((False, path))
             elif os.path.isdir(path):
-                for f in os.listdir(path):
-                    self.add_file(f)
+                for f in sorted(os.listdir(path)):
+                    f = os.path.join(path, f)
+                    if os.path.isfile(f):
+                        items.append((False, f))
             elif glob.glob(path):
                 for f in glob.glob(path):
-                    self.add_file(f)
+                    items.append((False, f))
             else:
                 raise ValueError(
                     'Path: "{0}" is not a valid format or does not exist. '
@@ -75,3 +127,12 @@ class Manifest(object):
                     'or URLs with http:// or https://.'
                     .format(path)
                 )
+
+        # Files and URLs are added in order
+        for is_url, group in itertools.groupby(items, lambda item: item[0]):
+            paths = [path for _, path in group]
+            if is_url:
+                for url in paths:
+                    self.add_url(url)
+            else:
+                self.add_files(paths)
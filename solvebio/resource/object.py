@@ -14,6 +14,8 @@ from solvebio.errors import SolveError
 from solvebio.errors import NotFoundError
 from solvebio.errors import FileUploadError
 from solvebio.utils.md5sum import md5sum
+from solvebio.utils.concurrency import DEFAULT_WORKERS
+from solvebio.utils.concurrency import imap_ordered
 
 from ..client import client
 
@@ -277,6 +279,97 @@ class Object(CreateableAPIResource,
                              client=_client,
                              **kwargs)
 
+    @classmethod
+    def ensure_folders(cls, full_paths, **kwargs):
+        """
+        Get or create many folders (and their parent folders) at once.
+
+        Shared parent folders are only looked up and created once.
+        Existing folders are resolved one depth level at a time, with the
+        lookups for each level made concurrently, and missing folders are
+        then created level by level (also concurrently).
+
+        Optional kwargs:
+
+            * create_vault: create vaults that do not exist (default False)
+            * workers: number of concurrent requests (default 4)
+
+        Returns a dict mapping each validated folder full path
+        (including parent folders) to its folder Object.
+        """
+        from solvebio import Vault
+
+        _client = kwargs.pop('client', None) or cls._client or client
+        create_vault = kwargs.pop('create_vault', False)
+        workers = kwargs.pop('workers', DEFAULT_WORKERS)
+
+        # Collect every folder path (including parents) by vault and depth
+        levels_by_vault = {}
+        for full_path in full_paths:
+            _, parts = cls.validate_full_path(full_path, client=_client)
+            levels = levels_by_vault.setdefault(parts['vault_full_path'], {})
+            path = parts['path']
+            while path != '/':
+                levels.setdefault(path.count('/'), set()).add(path)
+                path = os.path.dirname(path)
+
+        folders = {}
+        for vault_full_path, levels in levels_by_vault.items():
+            if create_vault:
+                vault = Vault.get_or_create_by_full_path(
+                    vault_full_path, client=_client)
+            else:
+                vault = Vault.get_by_full_path(vault_full_path,
+                                               client=_client)
+
+            def _get(path):
+                try:
+                    return path, cls.get_by_path(path,
+                                                 vault_id=vault.id,
+                                                 assert_type='folder',
+                                                 client=_client)
+                except NotFoundError:
+                    return path, None
+
+            def _create(path):
+                return path, cls.create(
+                    object_type='folder',
+                    vault_id=vault.id,
+                    filename=os.path.basename(path),
+                    parent_object_id=id_map[os.path.dirname(path)],
+                    client=_client)
+
+            # Resolve existing folders top-down. If a parent is missing,
+            # none of its children can exist, so they are not looked up.
+            id_map = {'/': None}
+            vault_folders = {}
+            missing = set()
+            for depth in sorted(levels):
+                paths = sorted(levels[depth])
+                lookups = [p for p in paths
+                           if os.path.dirname(p) not in missing]
+                missing.update(set(paths) - set(lookups))
+                for path, obj in imap_ordered(_get, lookups,
+                                              workers=workers):
+                    if obj is None:
+                        missing.add(path)
+                    else:
+                        id_map[path] = obj.id
+                        vault_folders[path] = obj
+
+            # Create missing folders, one depth level at a time
+            for depth in sorted(levels):
+                paths = sorted(p for p in levels[depth] if p in missing)
+                for path, obj in imap_ordered(_create, paths,
+                                              workers=workers):
+                    id_map[path] = obj.id
+                    vault_folders[path] = obj
+
+            for path, obj in vault_folders.items():
+                folders['{0}:{1}'.format(vault_full_path, path)] = obj
+
+        return folders
+
     @classmethod
     def upload_file(cls, local_path, remote_path, vault_full_path, **kwargs):
         from solvebio import Vault
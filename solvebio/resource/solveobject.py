@@ -16,7 +16,6 @@ def convert_to_solve_object(resp, **kwargs):
     if isinstance(resp, list):
         return [convert_to_solve_object(i, client=_client) for i in resp]
     elif isinstance(resp, dict) and not isinstance(resp, SolveObject):
-        resp = resp.copy()
         klass_name = resp.get('class_name')
         if isinstance(klass_name, six.string_types):
             klass = types.get(klass_name, SolveObject)
@@ -34,6 +33,10 @@ class SolveObject(dict):
     # Allows pre-setting a SolveClient
     _client = None
 
+    # Keys holding raw (unconverted) nested dicts and lists.
+    # They are converted into SolveObjects when first accessed.
+    _raw_keys = frozenset()
+
     def __init__(self, id=None, **params):
         super(SolveObject, self).__init__()
 
@@ -60,9 +63,51 @@ class SolveObject(dict):
         except KeyError as err:
             raise AttributeError(*err.args)
 
+    def __getitem__(self, k):
+        v = super(SolveObject, self).__getitem__(k)
+        if k in self._raw_keys:
+            v = convert_to_solve_object(v, client=self._client)
+            super(SolveObject, self).__setitem__(k, v)
+            self._raw_keys.discard(k)
+        return v
+
     def __setitem__(self, k, v):
         super(SolveObject, self).__setitem__(k, v)
         self._unsaved_values.add(k)
+        if k in self._raw_keys:
+            self._raw_keys.discard(k)
+
+    def _convert_raw_values(self):
+        for k in list(self._raw_keys):
+            self[k]
+
+    def get(self, k, default=None):
+        try:
+            return self[k]
+        except KeyError:
+            return default
+
+    def pop(self, k, *args):
+        if k in self:
+            self[k]
+        return super(SolveObject, self).pop(k, *args)
+
+    def items(self):
+        self._convert_raw_values()
+        return super(SolveObject, self).items()
+
+    def values(self):
+        self._convert_raw_values()
+        return super(SolveObject, self).values()
+
+    if six.PY2:
+        def iteritems(self):
+            self._convert_raw_values()
+            return super(SolveObject, self).iteritems()
+
+        def itervalues(self):
+            self._convert_raw_values()
+            return super(SolveObject, self).itervalues()
 
     @classmethod
     def construct_from(cls, values, **kwargs):
@@ -75,9 +120,14 @@ class SolveObject(dict):
         self.clear()
         self._unsaved_values = set()
 
+        # Nested dicts and lists are stored as-is (shared with the
+        # response) and only converted when accessed (see __getitem__).
+        raw_keys = set()
         for k, v in six.iteritems(values):
-            super(SolveObject, self).__setitem__(
-                k, convert_to_solve_object(v, client=self._client))
+            if isinstance(v, (dict, list)) and not isinstance(v, SolveObject):
+                raw_keys.add(k)
+            super(SolveObject, self).__setitem__(k, v)
+        self._raw_keys = raw_keys or SolveObject._raw_keys
 
     def request(self, method, url, **kwargs):
         response = self._client.request(method, url, **kwargs)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+
+import time
+import collections
+
+from .task import Task
+
+TaskEvent = collections.namedtuple(
+    'TaskEvent', ['task', 'status', 'previous_status', 'progress'])
+
+
+class TaskMonitor(object):
+    """
+    Follows many tasks at once: DatasetImports, DatasetExports,
+    DatasetMigrations, DatasetCommits, Tasks, or any other listable
+    resource with a status.
+
+    On each tick, the unfinished tasks of each type are refreshed with
+    a single batched request (`<Resource>.all(id__in=...)`, for up to
+    BATCH_SIZE tasks) instead of one request per task. Tasks missing
+    from the response are retrieved individually. If the first batched
+    response of a type is empty or contains other tasks (i.e. the
+    endpoint ignores the `id__in` filter), the tasks of that type are
+    retrieved individually for the rest of the run.
+
+    The time between ticks adapts to the activity: it starts at
+    `min_sleep` seconds, and is multiplied by `backoff` (up to
+    `max_sleep`) after each tick without any status or progress change.
+
+    With `follow_commits` (default), the dataset commits of imports
+    and migrations are followed too, including the commits created
+    while they run.
+
+    Each status or progress change is emitted as a TaskEvent(task,
+    status, previous_status, progress) to `callback`, which prints the
+    events by default. The progress is a (records processed, total)
+    tuple (the total may be None), or None.
+    """
+    ACTIVE_STATUSES = ('queued', 'running', 'pending')
+
+    # Maximum number of tasks refreshed per request
+    BATCH_SIZE = 100
+
+    def __init__(self, tasks=None, follow_commits=True, callback=None,
+                 min_sleep=1.0, max_sleep=Task.SLEEP_WAIT_DEFAULT * 6,
+                 backoff=1.5, **kwargs):
+        self._client = kwargs.get('client')
+        self.follow_commits = follow_commits
+        self.callback = callback or self.print_event
+        self.min_sleep = min_sleep
+        self.max_sleep = max(max_sleep, min_sleep)
+        self.backoff = backoff
+        self.sleep_seconds = min_sleep
+
+        self.tasks = collections.OrderedDict()
+        self._states = {}
+        # Whether the tasks of each type can be listed with id__in
+        # (None until the first batched request)
+        self._batched = {}
+        if tasks:
+            self.add(*tasks)
+
+    @staticmethod
+    def _key(task):
+        return (task.__class__, task.id)
+
+    @staticmethod
+    def progress(task):
+        """Returns the progress of a task, if available."""
+        if task.get('records_total') is not None:
+            # Dataset commits
+            return (task.get('records_modified'), task.get('records_total'))
+
+        metadata = task.get('metadata') or {}
+        processed = (metadata.get('progress') or {}).get('processed_records')
+        if processed is not None:
+            return (processed, None)
+        return None
+
+    @staticmethod
+    def print_event(event):
+        message = '{0} {1} is {2}'.format(
+            event.task.__class__.__name__, event.task.id, event.status)
+        if event.progress and event.status == 'running':
+            processed, total = event.progress
+            if total is not None:
+                message += ': {0}/{1} records'.format(processed, total)
+            else:
+                message += ': {0} records processed'.format(processed)
+        print(message)
+
+    def add(self, *tasks):
+        """Adds tasks to follow, and returns their events."""
+        events = []
+        for task in tasks:
+            key = self._key(task)
+            if key not in self.tasks:
+                self.tasks[key] = task
+                self._states[key] = (None, None)
+                events.extend(self._update(task))
+        return events
+
+    @property
+    def unfinished(self):
+        return [task for task in self.tasks.values()
+                if task.get('status') in self.ACTIVE_STATUSES]
+
+    @property
+    def done(self):
+        return not self.unfinished
+
+    def _update(self, task):
+        """
+        Emits the event of a task if its status or progress changed,
+        and follows its new commits.
+        """
+        key = self._key(task)
+        state = (task.get('status'), self.progress(task))
+        events = []
+        if state != self._states[key]:
+            event = TaskEvent(task, state[0], self._states[key][0], state[1])
+            self._states[key] = state
+            self.callback(event)
+            events.append(event)
+
+        if self.follow_commits and task.get('dataset_commits'):
+            from .datasetcommit import DatasetCommit
+
+            commits = []
+            for commit in task.get('dataset_commits'):
+                if not isinstance(commit, DatasetCommit):
+                    commit = DatasetCommit.construct_from(
+                        commit, client=self._client or task._client)
+                commits.append(commit)
+            events.extend(self.add(*commits))
+
+        return events
+
+    def _fetch(self, resource_class, ids):
+        """Retrieves tasks by ID, in batches when possible"""
+        results = {}
+        if self._batched.get(resource_class) is not False:
+            for i in range(0, len(ids), self.BATCH_SIZE):
+                batch = ids[i:i + self.BATCH_SIZE]
+                response = resource_class.all(
+                    id__in=','.join(str(_id) for _id in batch),
+                    limit=len(batch),
+                    client=self._client)
+                tasks = dict((task.id, task)
+                             for task in response.solve_objects())
+
+                if self._batched.get(resource_class) is None:
+                    # Only use batched requests if the filter is applied
+                    self._batched[resource_class] = \
+                        bool(tasks) and set(tasks) <= set(batch)
+                    if not self._batched[resource_class]:
+                        break
+
+                results.update((_id, tasks[_id])
+                               for _id in batch if _id in tasks)
+
+        # Tasks missing from a batched response are retrieved individually
+        for _id in ids:
+            if _id not in results:
+                results[_id] = resource_class.retrieve(
+                    _id, client=self._client)
+
+        return results
+
+    def poll(self):
+        """
+        Refreshes all the unfinished tasks once,
+        and returns the events of the tasks that changed.
+        """
+        by_class = collections.OrderedDict()
+        for resource_class, _id in self.tasks:
+            if self.tasks[(resource_class, _id)].get('status') in \
+                    self.ACTIVE_STATUSES:
+                by_class.setdefault(resource_class, []).append(_id)
+
+        events = []
+        for resource_class, ids in by_class.items():
+            for _id, values in self._fetch(resource_class, ids).items():
+                task = self.tasks[(resource_class, _id)]
+                task.refresh_from(values)
+                events.extend(self._update(task))
+
+        return events
+
+    def wait(self):
+        """
+        Polls the tasks until they are all finished,
+        and returns them.
+        """
+        while not self.done:
+            time.sleep(self.sleep_seconds)
+            if self.poll():
+                self.sleep_seconds = self.min_sleep
+            else:
+                self.sleep_seconds = min(self.sleep_seconds * self.backoff,
+                                         self.max_sleep)
+
+        return list(self.tasks.values())
@@ -297,3 +297,110 @@ def fake_migration_create(*args, **kwargs):
 
 def fake_export_create(*args, **kwargs):
     return FakeExportResponse(kwargs).create()
+
+
+class FakeQueryClient(object):
+    """
+    Serves dataset query requests from a list of records
+    (or a dict of dataset ID to records). Only supports
+    exact and "__in" filters combined with "and".
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.requests = []
+
+    def _dataset_records(self, url):
+        if isinstance(self.records, dict):
+            # URLs look like /v2/datasets/<id>/data
+            return self.records[url.split('/')[3]]
+        return self.records
+
+    @classmethod
+    def _matches(cls, record, filters):
+        for f in filters:
+            if isinstance(f, dict):
+                if not cls._matches(record, f['and']):
+                    return False
+                continue
+
+            field, value = f
+            if field.endswith('__in'):
+                if record.get(field[:-4]) not in value:
+                    return False
+            elif record.get(field) != value:
+                return False
+        return True
+
+    def post(self, url, data, **kwargs):
+        self.requests.append((url, data))
+        if url == '/v2/batch_query':
+            return [self._query('/v2/datasets/{0}/data'.format(q['dataset']), q)
+                    for q in data['queries']]
+        return self._query(url, data)
+
+    def _query(self, url, data):
+        records = [r for r in self._dataset_records(url)
+                   if self._matches(r, data.get('filters', []))]
+        offset = data.get('offset') or 0
+        limit = data.get('limit')
+        if limit is None:
+            limit = len(records)
+        return {
+            'results': [dict(r) for r in records[offset:offset + limit]],
+            'total': len(records),
+            'took': 1,
+        }
+
+
+class FakeRawResponse(object):
+    """A raw JSON response, as returned by the client with raw=True"""
+
+    def __init__(self, data):
+        import json
+
+        self.data = data
+        self.content = json.dumps(data).encode('utf-8')
+
+    def json(self):
+        return self.data
+
+
+class FakeAnnotatorClient(object):
+    """
+    Serves annotate requests by applying `annotate`
+    (a function that returns the new fields) to each record.
+    """
+
+    def __init__(self, annotate=None, delay=None):
+        import threading
+
+        self.annotate = annotate or (lambda record: {'annotated': True})
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, data, **kwargs):
+        import time
+
+        with self._lock:
+            self.requests.append((url, data))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            if self.delay:
+                time.sleep(self.delay(data))
+            results = []
+            for record in data['records']:
+                result = dict(record)
+                result.update(self.annotate(record))
+                results.append(result)
+            if kwargs.get('raw'):
+                return FakeRawResponse({'results': results})
+            return {'results': results}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
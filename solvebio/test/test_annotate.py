@@ -1,7 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import json
+import unittest
+
+from solvebio.annotate import Annotator
+from solvebio.annotate import AdaptiveChunkSize
+from solvebio.annotate import AnnotationCache
+from solvebio.annotate import Expression
+
 from .helper import SolveBioTestCase
+from .client_mocks import FakeAnnotatorClient
 
 
 class TestAnnotator(SolveBioTestCase):
@@ -26,3 +35,136 @@ class TestExpression(SolveBioTestCase):
         answer = self.client.Expression("record").evaluate(
             data={'record': 123}, data_type="integer")
         self.assertEqual(answer, 123)
+
+
+class TestAnnotatorMocked(unittest.TestCase):
+
+    def test_annotator_concurrency(self):
+        # Make the first chunks slower so that they finish last
+        client = FakeAnnotatorClient(
+            annotate=lambda r: {'double': r['i'] * 2},
+            delay=lambda data: 0.02 if data['records'][0]['i'] < 30 else 0)
+        records = ({'i': i} for i in range(95))
+
+        a = Annotator([], client=client, concurrency=4)
+        results = list(a.annotate(records, chunk_size=10))
+
+        self.assertEqual(results, [{'i': i, 'double': i * 2}
+                                   for i in range(95)])
+        self.assertEqual(len(client.requests), 10)
+        self.assertTrue(1 < client.max_in_flight <= 4)
+
+        # Sequential mode has at most one chunk in flight
+        client.max_in_flight = 0
+        a = Annotator([], client=client)
+        self.assertEqual(len(list(a.annotate([{'i': 1}] * 5))), 5)
+        self.assertEqual(client.max_in_flight, 1)
+
+    def test_adaptive_chunk_size(self):
+        adaptive = AdaptiveChunkSize(initial=100, min_size=10, max_size=500,
+                                     target_seconds=1.0, target_bytes=10000)
+        # Fast, small responses: grow (at most doubling)
+        adaptive.update(100, 0.1, 1000)
+        self.assertEqual(adaptive.size, 200)
+        # Large responses: shrink towards the target size
+        adaptive.update(200, 0.1, 16000)
+        self.assertEqual(adaptive.size, 125)
+        # Slow responses: shrink (at most halving), within limits
+        for _ in range(10):
+            adaptive.update(adaptive.size, 100.0, 1000)
+        self.assertEqual(adaptive.size, 10)
+        self.assertEqual(adaptive.sizes[:3], [100, 200, 125])
+
+    def test_annotator_adaptive(self):
+        client = FakeAnnotatorClient()
+        adaptive = AdaptiveChunkSize(initial=10, max_size=80,
+                                     target_bytes=50 * 1024)
+        a = Annotator([], client=client, adaptive=adaptive)
+        results = list(a.annotate({'i': i} for i in range(500)))
+
+        self.assertEqual([r['i'] for r in results], list(range(500)))
+        self.assertEqual(sum(adaptive.sizes), 500)
+        self.assertEqual(adaptive.sizes[:4], [10, 20, 40, 80])
+        self.assertEqual(
+            [len(d['records']) for _, d in client.requests], adaptive.sizes)
+
+    def test_annotator_adaptive_rate_limit(self):
+        import mock
+        from solvebio import SolveClient
+
+        class FakeResponse(object):
+            def __init__(self, status_code, body=None):
+                self.status_code = status_code
+                self.headers = {'retry-after': '0'}
+                self.content = json.dumps(body).encode('utf-8')
+
+            def json(self):
+                return json.loads(self.content.decode('utf-8'))
+
+        responses = [FakeResponse(429),
+                     FakeResponse(200, {'results': [{'i': 1}]})]
+        client = SolveClient(host='http://localhost', token='token')
+        adaptive = AdaptiveChunkSize(initial=10)
+        a = Annotator([], client=client, adaptive=adaptive)
+        with mock.patch('solvebio.client.Session.request') as Request, \
+                mock.patch('solvebio.client.time.sleep'):
+            Request.side_effect = lambda *args, **kwargs: responses.pop(0)
+            # The raw response is kept when the request is retried
+            self.assertEqual(list(a.annotate([{'i': 1}])), [{'i': 1}])
+        self.assertEqual(Request.call_count, 2)
+        self.assertEqual(adaptive.sizes, [1])
+
+    def test_annotator_cache(self):
+        import os
+        import tempfile
+
+        client = FakeAnnotatorClient(annotate=lambda r: {'n': r['v'] * 10})
+        cache = AnnotationCache(max_size=100)
+        a = Annotator([{'name': 'n'}], client=client, cache=cache)
+
+        records = [{'v': i % 5} for i in range(20)]
+        results = list(a.annotate(records, chunk_size=10))
+        self.assertEqual(results, [dict(r, n=r['v'] * 10) for r in records])
+        # Duplicates are only sent once, and the second chunk is cached
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(len(client.requests[0][1]['records']), 5)
+        # Results are independent copies
+        results[0]['n'] = None
+        self.assertEqual(list(a.annotate(records[:1]))[0]['n'], 0)
+
+        # Different fields use different keys
+        a = Annotator([{'name': 'other'}], client=client, cache=cache)
+        list(a.annotate(records))
+        self.assertEqual(len(client.requests), 2)
+
+        # Results can be stored on disk
+        path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        a = Annotator([], client=client, cache=AnnotationCache(path=path))
+        list(a.annotate(records))
+        a.cache.close()
+        a = Annotator([], client=client, cache=AnnotationCache(path=path))
+        self.assertEqual(len(list(a.annotate(records))), 20)
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual(a.cache.hits, 5)
+        a.cache.close()
+        os.remove(path)
+
+    def test_expression_evaluate_many(self):
+        field = Expression.EVALUATE_FIELD
+        client = FakeAnnotatorClient(
+            annotate=lambda r: {field: r['a'] + r['b']})
+        expr = Expression('record.a + record.b', client=client)
+
+        records = [{'a': i, 'b': i % 3} for i in range(50)]
+        results = expr.evaluate_many(records, data_type='integer',
+                                     chunk_size=20, concurrency=2)
+        self.assertEqual(list(results), [r['a'] + r['b'] for r in records])
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual(client.requests[0][1]['fields'][0]['expression'],
+                         'record.a + record.b')
+
+        # Repeated records are only evaluated once
+        client.requests = []
+        results = expr.evaluate_many([{'a': 1, 'b': 2}] * 30, memoize=True)
+        self.assertEqual(list(results), [3] * 30)
+        self.assertEqual(len(client.requests[0][1]['records']), 1)
@@ -2,6 +2,10 @@ from __future__ import absolute_import
 
 import uuid
 
+import mock
+from six.moves.urllib.parse import parse_qs
+from six.moves.urllib.parse import urlparse
+
 from .helper import SolveBioTestCase
 
 
@@ -21,6 +25,48 @@ class APIResourceTests(SolveBioTestCase):
             pass
         self.assertTrue(i == n_folders - 1)
 
+    def _fake_list_request(self, total, limit):
+        base_url = 'https://api.solvebio.com/v2/objects'
+
+        def _request(method, url, **kwargs):
+            query = parse_qs(urlparse(url).query)
+            page = int(query.get('page', ['1'])[0])
+            n_pages = (total + limit - 1) // limit
+            start = (page - 1) * limit
+            return {
+                'class_name': 'list',
+                'total': total,
+                'url': url,
+                'data': [{'class_name': 'Object', 'id': i}
+                         for i in range(start, min(start + limit, total))],
+                'links': {
+                    'prev': None,
+                    'next': '{0}?limit={1}&page={2}'.format(
+                        base_url, limit, page + 1)
+                    if page < n_pages else None
+                }
+            }
+
+        return _request
+
+    def test_apiresource_parallel_iteration(self):
+        with mock.patch.object(self.client, 'request') as request:
+            request.side_effect = self._fake_list_request(95, 10)
+
+            objects = self.client.Object.all(limit=10)
+            self.assertEqual([o.id for o in objects.to_list(workers=4)],
+                             list(range(95)))
+            # The first page is reused, each remaining page fetched once
+            self.assertEqual(request.call_count, 10)
+
+            # Serial iteration gives the same results
+            self.assertEqual([o.id for o in objects.to_list(workers=1)],
+                             list(range(95)))
+
+            # Parallel mode can be set when listing
+            objects = self.client.Object.all(limit=10, workers=3)
+            self.assertEqual([o.id for o in objects], list(range(95)))
+
     def test_apiresource_serialize_metadata(self):
         folder_no_metadata = self.client.Object.\
             get_or_create_by_full_path('~/{}'.format(uuid.uuid4()), object_type='folder')
@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import json
 import unittest
 
 from solvebio.resource.util import class_to_api_name
@@ -12,3 +13,32 @@ class ConversionTest(unittest.TestCase):
                 ('Depository', 'depositories')]:
 
             self.assertEqual(class_to_api_name(class_name), expect)
+
+    def test_lazy_conversion(self):
+        from solvebio.resource import Object
+        from solvebio.resource.solveobject import SolveObject
+        from solvebio.resource.solveobject import convert_to_solve_object
+
+        vault = {'id': 2, 'class_name': 'Vault', 'name': 'test'}
+        resp = {
+            'class_name': 'Object',
+            'id': 1,
+            'vault': vault,
+            'tags': ['a', 'b'],
+            'users': [{'id': 3}],
+        }
+        obj = convert_to_solve_object(resp)
+        self.assertTrue(isinstance(obj, Object))
+
+        # Nested values are shared with the response until accessed
+        self.assertTrue(dict.__getitem__(obj, 'vault') is vault)
+        self.assertEqual(str(obj), json.dumps(resp, sort_keys=True, indent=2))
+
+        self.assertEqual(type(obj['vault']).__name__, 'Vault')
+        self.assertTrue(obj['vault'] is obj['vault'])
+        self.assertTrue(isinstance(obj.get('users')[0], SolveObject))
+        self.assertEqual(obj.tags, ['a', 'b'])
+        self.assertTrue(all(isinstance(v, SolveObject)
+                            for k, v in obj.items() if k == 'vault'))
+        # The response itself is never modified
+        self.assertTrue(type(resp['vault']) is dict)
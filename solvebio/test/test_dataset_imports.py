@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+
+import os
+import threading
+import unittest
+
+import mock
+
+from solvebio.test.client_mocks import FakeDatasetImport
+
+
+class CreateFromRecordsTests(unittest.TestCase):
+
+    def _fake_create(self):
+        lock = threading.Lock()
+        self.chunks = []
+
+        def _create(*args, **kwargs):
+            with lock:
+                self.chunks.append(kwargs)
+            return FakeDatasetImport(dict(id=len(self.chunks))).create()
+        return _create
+
+    @mock.patch('solvebio.resource.taskmonitor.TaskMonitor.wait',
+                autospec=True)
+    @mock.patch('solvebio.resource.DatasetImport.create')
+    def test_create_from_records(self, Create, Wait):
+        from solvebio import DatasetImport
+
+        Create.side_effect = self._fake_create()
+        consumed = []
+
+        def _records():
+            for i in range(2500):
+                consumed.append(i)
+                yield {'i': i}
+
+        imports = DatasetImport.create_from_records(
+            100, _records(), chunk_size=1000, concurrency=2,
+            commit_mode='upsert')
+        self.assertEqual(len(imports), 3)
+        self.assertEqual(len(consumed), 2500)
+        self.assertEqual(sorted(len(c['data_records']) for c in self.chunks),
+                         [500, 1000, 1000])
+        records = sorted(r['i'] for c in self.chunks for r in c['data_records'])
+        self.assertEqual(records, list(range(2500)))
+        for chunk in self.chunks:
+            self.assertEqual(chunk['dataset_id'], 100)
+            self.assertEqual(chunk['commit_mode'], 'upsert')
+        self.assertFalse(Wait.called)
+
+        # Follows all the imports
+        self.chunks = []
+        DatasetImport.create_from_records(100, iter([{'i': 1}]), follow=True)
+        self.assertEqual(len(self.chunks), 1)
+        self.assertEqual(Wait.call_count, 1)
+
+    @mock.patch('solvebio.resource.taskmonitor.TaskMonitor.wait',
+                autospec=True)
+    @mock.patch('solvebio.resource.DatasetImport.create')
+    def test_import_vcf(self, Create, Wait):
+        from solvebio.contrib.vcf_parser.importer import import_vcf
+        from solvebio.contrib.vcf_parser.vcf_parser import ExpandingVCFParser
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+
+        Create.side_effect = self._fake_create()
+        path = os.path.join(os.path.dirname(__file__), 'data', 'sample_snpeff.vcf')
+        parser = ExpandingVCFParser(filename=path, reader_class=FastVCFReader)
+        imports = import_vcf(parser, 'dataset-id', chunk_size=30)
+        self.assertEqual(len(imports), 4)
+        # The imports are followed together
+        self.assertEqual(Wait.call_count, 1)
+        monitor = Wait.call_args[0][0]
+        self.assertEqual(list(monitor.tasks.values()), imports)
+        self.assertEqual(sum(len(c['data_records']) for c in self.chunks), 101)
+        self.assertEqual(self.chunks[0]['dataset_id'], 'dataset-id')
+        parser.close()
+
+
+class ImportRecordsTests(unittest.TestCase):
+
+    def _dataset(self):
+        from solvebio.test.client_mocks import FakeDatasetResponse
+        return FakeDatasetResponse(dict(id=42)).create()
+
+    @mock.patch('solvebio.resource.taskmonitor.TaskMonitor.wait',
+                autospec=True)
+    @mock.patch('solvebio.resource.DatasetImport.create')
+    def test_import_records(self, Create, Wait):
+        Create.side_effect = lambda **kwargs: FakeDatasetImport(kwargs).create()
+        records = ({'i': i} for i in range(25))
+        imports = self._dataset().import_records(records, chunk_size=10,
+                                                 commit_mode='append')
+        self.assertEqual(len(imports), 3)
+        self.assertEqual(Wait.call_count, 1)
+        sent = [c[1] for c in Create.call_args_list]
+        self.assertEqual([len(c['data_records']) for c in sent], [10, 10, 5])
+        self.assertTrue(all(c['dataset_id'] == 42 for c in sent))
+        self.assertTrue(all(c['commit_mode'] == 'append' for c in sent))
+
+    @mock.patch('solvebio.resource.Object.upload_file')
+    @mock.patch('solvebio.resource.Vault.get_or_create_uploads_path')
+    @mock.patch('solvebio.resource.Vault.get_personal_vault')
+    @mock.patch('solvebio.resource.DatasetImport.follow')
+    @mock.patch('solvebio.resource.DatasetImport.create')
+    def test_import_records_compressed(self, Create, Follow, PersonalVault,
+                                       UploadsPath, UploadFile):
+        import gzip
+        import json
+        from solvebio.test.client_mocks import FakeObjectResponse
+        from solvebio.test.client_mocks import FakeVaultResponse
+
+        Create.side_effect = lambda **kwargs: FakeDatasetImport(kwargs).create()
+        PersonalVault.return_value = FakeVaultResponse(dict(name='user-1')).create()
+        UploadsPath.return_value = '/Uploads'
+        uploaded = {}
+        lock = threading.Lock()
+
+        def _upload_file(path, remote_path, vault_full_path, **kwargs):
+            self.assertEqual(remote_path, '/Uploads')
+            with gzip.open(path, 'rb') as f:
+                records = [json.loads(line.decode('utf-8')) for line in f]
+            with lock:
+                uploaded[os.path.basename(path)] = records
+            return FakeObjectResponse(dict(
+                id=len(uploaded), filename=os.path.basename(path),
+                object_type='file')).create()
+        UploadFile.side_effect = _upload_file
+
+        imports = self._dataset().import_records(
+            ({'i': i} for i in range(25)), chunk_size=10, compress=True,
+            concurrency=2, follow=False)
+        self.assertEqual(len(imports), 1)
+        self.assertFalse(Follow.called)
+
+        # A single import of all the uploaded files
+        self.assertEqual(Create.call_count, 1)
+        manifest = Create.call_args[1]['manifest']
+        names = [f['name'] for f in manifest['files']]
+        self.assertEqual(sorted(names), sorted(uploaded))
+        self.assertTrue(all(name.endswith('.json.gz') for name in names))
+        records = [r for name in names for r in uploaded[name]]
+        self.assertEqual(records, [{'i': i} for i in range(25)])
+
+        # Temporary files are removed
+        self.assertFalse(any(os.path.exists(c[0][0]) for c in UploadFile.call_args_list))
@@ -3,6 +3,11 @@ from __future__ import print_function
 
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import solvebio
 from solvebio import Query, Filter, GenomicFilter
 
@@ -39,6 +44,155 @@ class FilterTest(unittest.TestCase):
                          "<Filter [{'or': [('omim_id', 144650)," +
                          " ('omim_id', 144600), ('omim_id', 145300)]}]>")
 
+    def test_filter_immutable(self):
+        import pickle
+
+        f = Filter()
+        steps = []
+        for i in range(3000):
+            f |= Filter(gene=i)
+            steps.append(f)
+        self.assertEqual(len(f.filters[0]['or']), 3000)
+        self.assertEqual(f.filters[0]['or'][-1], ('gene', 2999))
+        # Previous filters are not modified
+        self.assertEqual(steps[0].filters, [('gene', 0)])
+        self.assertEqual(len(steps[10].filters[0]['or']), 11)
+
+        f = f & ~Filter(gene='x')
+        self.assertEqual(f.filters[0]['and'][1], {'not': ('gene', 'x')})
+        f2 = pickle.loads(pickle.dumps(f))
+        self.assertEqual(f2.filters, f.filters)
+        self.assertEqual((f2 | Filter(a=1)).filters,
+                         (f | Filter(a=1)).filters)
+
+    def test_normalize(self):
+        f = Filter(b=2, a=1) & (Filter(x__gte=5) & Filter(x__range=[1, 10]) &
+                                Filter(x__lt=9) & Filter(a=1))
+        self.assertEqual(f.normalize(scalar_fields=['x']).filters, [{'and': [
+            ('a', 1), ('b', 2), ('x__gte', 5), ('x__lt', 9)]}])
+        # Bounds are only merged on scalar fields
+        self.assertEqual(f.normalize().filters, [{'and': [
+            ('a', 1), ('b', 2), ('x__gte', 5), ('x__lt', 9),
+            ('x__range', [1, 10])]}])
+        # Disjoint bounds are not merged into an inverted range
+        f = Filter(x__gte=5) & Filter(x__lte=3)
+        self.assertEqual(f.normalize(scalar_fields=['x']).filters, [{'and': [
+            ('x__gte', 5), ('x__lte', 3)]}])
+
+        f = Filter(g='A') | Filter(g__in=['C', 'B', 'A']) | \
+            (Filter(p__range=[1, 5]) | Filter(p__range=[3, 8])) | \
+            Filter(p__range=[10, 12])
+        self.assertEqual(f.normalize().filters, [{'or': [
+            ('g__in', ['A', 'B', 'C']),
+            ('p__range', [1, 8]),
+            ('p__range', [10, 12])]}])
+
+        f = ~~Filter(y__in=[1, 2, 3]) & Filter(y__in=[3, 2]) & \
+            ~Filter(z='a')
+        self.assertEqual(f.normalize(scalar_fields=['y']).filters, [{'and': [
+            ('y__in', [2, 3]), {'not': ('z', 'a')}]}])
+        self.assertEqual(f.normalize().filters, [{'and': [
+            ('y__in', [1, 2, 3]), ('y__in', [2, 3]), {'not': ('z', 'a')}]}])
+
+        # Raw filters are normalized as well
+        f = Filter('[["a", 1], {"and": [["b", 2], ["a", 1]]}]')
+        self.assertEqual(f.normalize().filters, [{'and': [('a', 1), ('b', 2)]}])
+        self.assertEqual(Filter().normalize().filters, [])
+
+    def test_normalize_list_fields(self):
+        # A term on a list field matches if any value matches,
+        # so normalized filters must match the same records
+        records = [{'tags': ['a', 'c'], 'x': [1, 8]},
+                   {'tags': ['b'], 'x': [4]},
+                   {'tags': ['d'], 'x': []}]
+        filters = [
+            Filter(tags__in=['a', 'b']) & Filter(tags__in=['b', 'c']),
+            Filter(tags__in=['a']) | Filter(tags='d') | Filter(tags='a'),
+            Filter(x__gte=5) & Filter(x__lte=3),
+            Filter(x__range=[0, 2]) & Filter(x__gt=6) & Filter(tags='a'),
+            Filter(x__range=[0, 2]) | Filter(x__range=[1, 5]),
+        ]
+        for f in filters:
+            normalized = f.normalize()
+            self.assertEqual(list(normalized.apply(records)),
+                             list(f.apply(records)))
+
+        q1 = Query('dataset').filter(tags__in=['a', 'b']) \
+            .filter(tags__in=['b', 'c'])
+        q2 = Query('dataset').filter(tags__in=['b'])
+        self.assertNotEqual(q1.fingerprint(), q2.fingerprint())
+        self.assertEqual(q1.fingerprint(scalar_fields=['tags']),
+                         q2.fingerprint(scalar_fields=['tags']))
+
+    def test_fingerprint(self):
+        q1 = Query('dataset').filter(a=1, b=2).filter(c__in=[3, 1])
+        q2 = Query('dataset').filter(c__in=[1, 3, 1]).filter(b=2) \
+            .filter(Filter(a=1) & Filter(b=2))
+        self.assertEqual(q1.fingerprint(), q2.fingerprint())
+        self.assertNotEqual(q1.fingerprint(), q1.filter(a=2).fingerprint())
+        self.assertNotEqual(q1.fingerprint(), q1.limit(10).fingerprint())
+        self.assertNotEqual(q1.fingerprint(),
+                            Query('other').filter(a=1, b=2, c__in=[1, 3])
+                            .fingerprint())
+
+    def _records(self):
+        return [
+            {'gene': 'BRCA2', 'score': 0.5, 'tags': ['a', 'b'],
+             'genomic_coordinates': {'chromosome': '13', 'start': 100, 'stop': 120}},
+            {'gene': 'TP53', 'score': 2.0, 'tags': [],
+             'genomic_coordinates': {'chromosome': '17', 'start': 150, 'stop': 150}},
+            {'gene': 'BRCA1', 'score': None, 'tags': ['b'],
+             'genomic_coordinates': {'chromosome': '17', 'start': 200, 'stop': 300}},
+        ]
+
+    def test_compile(self):
+        records = self._records()
+
+        def genes(f):
+            return [r['gene'] for r in f.apply(records)]
+
+        self.assertEqual(genes(Filter()), ['BRCA2', 'TP53', 'BRCA1'])
+        self.assertEqual(genes(Filter(gene__in=['TP53', 'BRCA1'])), ['TP53', 'BRCA1'])
+        self.assertEqual(genes(Filter(score__gt=0.5)), ['TP53'])
+        self.assertEqual(genes(Filter(score__lte=2)), ['BRCA2', 'TP53'])
+        self.assertEqual(genes(Filter(score__range=[0.5, 2])), ['BRCA2', 'TP53'])
+        self.assertEqual(genes(Filter(score__between=[0.5, 2])), [])
+        self.assertEqual(genes(Filter(score=None)), ['BRCA1'])
+        self.assertEqual(genes(Filter(tags='b')), ['BRCA2', 'BRCA1'])
+        self.assertEqual(genes(Filter(tags=None)), ['TP53'])
+        self.assertEqual(genes(~Filter(tags='a') & Filter(score__gte=1)), ['TP53'])
+        self.assertEqual(genes(Filter(gene='TP53') | Filter(tags='a')), ['BRCA2', 'TP53'])
+        self.assertEqual(genes(GenomicFilter('chr17', 140, 160)), ['TP53'])
+        self.assertEqual(genes(GenomicFilter('chr17', 250)), ['BRCA1'])
+        self.assertEqual(genes(GenomicFilter('chr17', 200, 300, exact=True)), ['BRCA1'])
+        self.assertEqual(genes(GenomicFilter.from_regions(['chr13:1-100', 'chr17:300-400'])),
+                         ['BRCA2', 'BRCA1'])
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_mask(self):
+        records = self._records()
+        columns = {
+            'gene': [r['gene'] for r in records],
+            'score': numpy.array([0.5, 2.0, numpy.nan]),
+            'tags': numpy.array([r['tags'] for r in records], dtype=object),
+            'genomic_coordinates.chromosome': ['13', '17', '17'],
+            'genomic_coordinates.start': [100, 150, 200],
+            'genomic_coordinates.stop': [120, 150, 300],
+        }
+        filters = [
+            Filter(),
+            Filter(gene__in=['TP53', 'BRCA1']),
+            Filter(score__gt=0.5) | Filter(tags='b'),
+            Filter(score__range=[0.5, 2]) & ~Filter(gene='TP53'),
+            Filter(score__between=[0.5, 2]),
+            GenomicFilter('chr17', 140, 160),
+            Filter(missing=None),
+        ]
+        for f in filters:
+            predicate = f.compile()
+            self.assertEqual(list(f.mask(columns)),
+                             [predicate(r) for r in records], f)
+
     def test_raw_filters(self):
         # Simple filter
         raw_filter = '[["field_a", "value_a"]]'
@@ -165,6 +319,73 @@ class GenomicFilterTest(unittest.TestCase):
             print(repr(f))
         self.assertTrue(repr(f) in expected)
 
+    def test_from_regions(self):
+        import os
+        import tempfile
+
+        regions = [
+            ('chr2', 500, 600),
+            'chr1:100-200',
+            ('1', 150, 250),
+            ('1', 251),
+            ('chr10', 5, 5),
+            ('1', 1000, 2000),
+            ('2', 500, 600),
+        ]
+        f = GenomicFilter.from_regions(regions)
+        self.assertEqual(f.regions, [
+            ('1', 100, 251), ('1', 1000, 2000), ('2', 500, 600), ('10', 5, 5)])
+        self.assertEqual(f.filters[0]['or'][0], {'and': [
+            ('genomic_coordinates.chromosome', '1'),
+            {'or': [
+                {'and': [('genomic_coordinates.start__lte', 251),
+                         ('genomic_coordinates.stop__gte', 100)]},
+                {'and': [('genomic_coordinates.start__lte', 2000),
+                         ('genomic_coordinates.stop__gte', 1000)]},
+            ]}
+        ]})
+
+        # Exact regions are only deduplicated
+        f = GenomicFilter.from_regions(regions, exact=True)
+        self.assertEqual(len(f.regions), 6)
+        self.assertEqual(f.filters[0]['or'][-1], {'and': [
+            ('genomic_coordinates.chromosome', '10'),
+            {'and': [('genomic_coordinates.start', 5),
+                     ('genomic_coordinates.stop', 5)]}
+        ]})
+
+        split = f.split(4)
+        self.assertEqual([len(s.regions) for s in split], [4, 2])
+        self.assertEqual(split[1].regions, [('2', 500, 600), ('10', 5, 5)])
+
+        # BED files use 0-based, half-open intervals
+        fd, path = tempfile.mkstemp(suffix='.bed')
+        with os.fdopen(fd, 'w') as bed:
+            bed.write('track name=panel\n'
+                      'chr1\t99\t200\tA\n'
+                      'chr1\t150\t300\tB\n'
+                      'chrX\t0\t10\n')
+        f = GenomicFilter.from_regions(path)
+        os.remove(path)
+        self.assertEqual(f.regions, [('1', 100, 300), ('X', 1, 10)])
+
+        query = Query('dataset').regions(['chr1:100-200'])
+        self.assertEqual(repr(query._filters[0]),
+                         repr(GenomicFilter.from_regions(['chr1:100-200'])))
+
+        # Single regions are not read as BED files
+        self.assertEqual(GenomicFilter.from_regions('chr1:100-200').regions,
+                         [('1', 100, 200)])
+        self.assertEqual(GenomicFilter.from_regions('chrX:1,000').regions,
+                         [('X', 1000, 1000)])
+        self.assertRaises(ValueError, GenomicFilter.from_regions,
+                          '/missing/panel.bed')
+
+        # An empty panel must not match the whole dataset
+        self.assertRaises(ValueError, GenomicFilter.from_regions, [])
+        self.assertRaises(ValueError, Query('dataset').regions, iter([]))
+        self.assertRaises(ValueError, list, Query('dataset').iter_regions([]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,11 @@
 from __future__ import absolute_import
 
+import unittest
+
+from six.moves.urllib.parse import unquote
+
+from solvebio.resource import Dataset
+
 from .helper import SolveBioTestCase
 
 
@@ -36,3 +42,58 @@ class LookupTests(SolveBioTestCase):
         joint_lookup = self.dataset.lookup(sbid_one, sbid_two)
         self.assertEqual(joint_lookup[0], record_one)
         self.assertEqual(joint_lookup[1], record_two)
+
+
+class FakeLookupClient(object):
+    _host = 'https://api.example.com'
+
+    def __init__(self, records):
+        self.records = dict((r['_id'], r) for r in records)
+        self.urls = []
+
+    def get(self, url, params):
+        self.urls.append(self._host + url)
+        sbids = [unquote(i) for i in url.rsplit('/', 1)[1].split(',')]
+        # Return the records in a different order than requested
+        return {'results': [self.records[i] for i in sorted(sbids)
+                            if i in self.records]}
+
+
+class MockLookupTests(unittest.TestCase):
+
+    def test_lookup_chunks(self):
+        records = [{'_id': 'ID{0:05d}'.format(i), 'value': i}
+                   for i in range(1000)]
+        fake_client = FakeLookupClient(records)
+        dataset = Dataset(1, client=fake_client)
+
+        sbids = [r['_id'] for r in reversed(records)]
+        results = dataset.lookup(sbids + ['missing'], sbids[0], concurrency=3)
+        self.assertEqual(results, list(reversed(records)))
+        self.assertTrue(len(fake_client.urls) > 1)
+        for url in fake_client.urls:
+            self.assertTrue(len(url) <= Dataset.LOOKUP_URL_MAX_LENGTH)
+
+        # Variable arguments are still supported
+        self.assertEqual(dataset.lookup('ID00002', 'ID00001'),
+                         [records[2], records[1]])
+
+        results = dataset.lookup(iter(sbids), stream=True)
+        self.assertFalse(isinstance(results, list))
+        self.assertEqual(list(results), list(reversed(records)))
+
+    def test_lookup_encoded_ids(self):
+        # IDs are percent-encoded, and the encoded URL fits the limit
+        records = [{'_id': 'chr1:{0}/A,C'.format(i), 'value': i}
+                   for i in range(300)]
+        fake_client = FakeLookupClient(records)
+        dataset = Dataset(1, client=fake_client)
+
+        results = dataset.lookup([r['_id'] for r in records])
+        self.assertEqual(results, records)
+        self.assertTrue(len(fake_client.urls) > 1)
+        for url in fake_client.urls:
+            self.assertTrue(url.startswith(fake_client._host + '/v2/datasets/1/data/'))
+            self.assertTrue(len(url) <= Dataset.LOOKUP_URL_MAX_LENGTH)
+        # Chunks are filled up to the limit
+        self.assertTrue(len(fake_client.urls[0]) > Dataset.LOOKUP_URL_MAX_LENGTH - 30)
@@ -0,0 +1,94 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from solvebio.test.client_mocks import FakeObjectResponse
+from solvebio.test.client_mocks import FakeVaultResponse
+
+
+class ManifestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for i in range(6):
+            with open(os.path.join(self.tmpdir, 'file{0}.vcf'.format(i)), 'w') as f:
+                f.write('data {0}'.format(i))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @mock.patch('solvebio.resource.Object.upload_file')
+    @mock.patch('solvebio.resource.Vault.get_or_create_uploads_path')
+    @mock.patch('solvebio.resource.Vault.get_personal_vault')
+    def test_manifest_add(self, PersonalVault, UploadsPath, UploadFile):
+        from solvebio import Manifest
+
+        PersonalVault.return_value = FakeVaultResponse(dict(name='user-1')).create()
+        UploadsPath.return_value = '/Uploads'
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'max_in_flight': 0}
+
+        def _upload_file(path, remote_path, vault_full_path, **kwargs):
+            with lock:
+                state['in_flight'] += 1
+                state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+            # Later files finish first
+            time.sleep(0.05 - 0.005 * int(path[-5]))
+            with lock:
+                state['in_flight'] -= 1
+            return FakeObjectResponse(dict(
+                id=path, filename=os.path.basename(path), object_type='file')).create()
+        UploadFile.side_effect = _upload_file
+
+        manifest = Manifest(concurrency=3)
+        manifest.add(self.tmpdir, 'https://example.com/file.vcf',
+                     os.path.join(self.tmpdir, 'file1.*'))
+
+        names = [f.get('name', f.get('url')) for f in manifest.manifest['files']]
+        self.assertEqual(names, ['file{0}.vcf'.format(i) for i in range(6)] +
+                         ['https://example.com/file.vcf', 'file1.vcf'])
+        self.assertEqual(manifest.manifest['files'][0]['object_id'],
+                         os.path.join(self.tmpdir, 'file0.vcf'))
+
+        # The uploads folder is only resolved once
+        self.assertEqual(PersonalVault.call_count, 1)
+        self.assertEqual(UploadsPath.call_count, 1)
+        self.assertEqual(UploadFile.call_count, 7)
+        self.assertEqual(state['max_in_flight'], 3)
+
+    @mock.patch('solvebio.resource.Object.upload_file')
+    @mock.patch('solvebio.resource.Vault.get_or_create_uploads_path')
+    @mock.patch('solvebio.resource.Vault.get_personal_vault')
+    def test_manifest_upload_folder(self, PersonalVault, UploadsPath, UploadFile):
+        from solvebio import Manifest
+
+        def _slow(value):
+            def _call(*args, **kwargs):
+                time.sleep(0.05)
+                return value
+            return _call
+
+        PersonalVault.side_effect = _slow(
+            FakeVaultResponse(dict(name='user-1')).create())
+        UploadsPath.side_effect = _slow('/Uploads')
+        UploadFile.side_effect = lambda path, *args, **kwargs: \
+            FakeObjectResponse(dict(id=path, filename=os.path.basename(path),
+                                    object_type='file')).create()
+
+        manifest = Manifest(concurrency=4)
+        manifest.add(self.tmpdir)
+        manifest.add(os.path.join(self.tmpdir, 'file1.vcf'))
+
+        # Resolved once, before the concurrent uploads
+        self.assertEqual(PersonalVault.call_count, 1)
+        self.assertEqual(UploadsPath.call_count, 1)
+        self.assertEqual(len(manifest.manifest['files']), 7)
+        self.assertEqual(set(c[0][1] for c in UploadFile.call_args_list),
+                         set(['/Uploads']))
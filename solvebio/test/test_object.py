@@ -7,6 +7,8 @@ import mock
 from .helper import SolveBioTestCase
 from solvebio.test.client_mocks import fake_object_create, fake_object_save
 from solvebio.test.client_mocks import fake_dataset_create
+from solvebio.test.client_mocks import fake_vault_create
+from solvebio.errors import NotFoundError
 
 
 class ObjectTests(SolveBioTestCase):
@@ -240,6 +242,48 @@ class ObjectTests(SolveBioTestCase):
         file_.tag(tags)
         self.assertTrue(file_.has_tag(tags))
 
+    @mock.patch('solvebio.resource.Vault.get_by_full_path')
+    @mock.patch('solvebio.resource.Object.create')
+    @mock.patch('solvebio.resource.Object.get_by_path')
+    def test_object_ensure_folders(self, GetByPath, ObjectCreate, VaultGet):
+        VaultGet.side_effect = fake_vault_create
+        existing = {'/a': 1}
+        created = {}
+
+        def _get_by_path(path, **kwargs):
+            if path not in existing:
+                raise NotFoundError()
+            return fake_object_create(id=existing[path], path=path)
+
+        def _create(**kwargs):
+            obj = fake_object_create(id=len(created) + 10, **kwargs)
+            created[kwargs['filename']] = kwargs['parent_object_id']
+            return obj
+
+        GetByPath.side_effect = _get_by_path
+        ObjectCreate.side_effect = _create
+
+        folders = self.client.Object.ensure_folders([
+            'acme:myVault:/a/b/c',
+            'acme:myVault:/a/b/d',
+            'acme:myVault:/a/b/c/',
+            'acme:myVault:/x',
+        ])
+
+        self.assertEqual(sorted(folders), [
+            'acme:myVault:/a',
+            'acme:myVault:/a/b',
+            'acme:myVault:/a/b/c',
+            'acme:myVault:/a/b/d',
+            'acme:myVault:/x',
+        ])
+        # Children of missing folders are never looked up
+        looked_up = sorted(c[0][0] for c in GetByPath.call_args_list)
+        self.assertEqual(looked_up, ['/a', '/a/b', '/x'])
+        # Each missing folder is created once, under its parent
+        b_id = folders['acme:myVault:/a/b'].id
+        self.assertEqual(created, {'b': 1, 'c': b_id, 'd': b_id, 'x': None})
+
     def test_object_set_metadata(self):
         folder = self.client.Object.\
             get_or_create_by_full_path('~/{}'.format(uuid.uuid4()), object_type='folder')
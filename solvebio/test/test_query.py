@@ -1,9 +1,16 @@
 from __future__ import absolute_import
 
+import pickle
+import unittest
+
+from solvebio.query import BatchQuery
+from solvebio.query import CompactRecord
 from solvebio.query import Filter
+from solvebio.query import Query
 from solvebio import SolveError
 
 from .helper import SolveBioTestCase
+from .client_mocks import FakeQueryClient
 from six.moves import map
 from six.moves import range
 
@@ -345,3 +352,232 @@ class BaseQueryTest(SolveBioTestCase):
         join_query = query_a.join(query_b, key='symbol', always_prefix=False)
         expect = [{'symbol': 'A1BG', 'entrez_id': '1.0'}]
         self.assertEqual(list(join_query), expect)
+
+
+class MockQueryTest(unittest.TestCase):
+    """Test Queries against a fake client"""
+
+    def setUp(self):
+        self.records = [
+            {
+                'gene': 'GENE{0}'.format(i % 3),
+                'position': i,
+                'genomic_coordinates': {'chromosome': '1', 'start': i},
+                'tags': ['a', {'b': i}]
+            }
+            for i in range(25)
+        ]
+        self.client = FakeQueryClient(self.records)
+
+    def test_compact_records(self):
+        results = Query(1, client=self.client, page_size=10,
+                        result_class=CompactRecord)
+        records = list(results)
+        self.assertEqual(len(records), 25)
+        self.assertEqual([r.to_dict() for r in records], self.records)
+
+        record = records[4]
+        self.assertTrue(isinstance(record, CompactRecord))
+        self.assertEqual(record['position'], 4)
+        self.assertEqual(record['genomic_coordinates']['start'], 4)
+        self.assertEqual(record.get('missing', 'default'), 'default')
+        self.assertEqual(dict(record.items())['gene'], 'GENE1')
+        self.assertTrue('gene' in record)
+        self.assertEqual(record, records[4])
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+        # Field names are shared between records
+        self.assertTrue(records[0]._table is records[24]._table)
+        with self.assertRaises(TypeError):
+            record['gene'] = 'other'
+
+    def test_result_class(self):
+        class Result(object):
+            def __init__(self, values):
+                self.values = values
+
+        # Results of execute() are instances of result_class
+        query = Query(1, client=self.client, page_size=10, result_class=Result)
+        _, response = query.execute()
+        self.assertEqual(len(response['results']), 10)
+        self.assertTrue(all(isinstance(r, Result) for r in response['results']))
+        self.assertEqual([r.values for r in response['results']],
+                         self.records[:10])
+        self.assertEqual([r.values for r in query], self.records)
+
+        # dict results are returned as they are
+        _, response = Query(1, client=self.client, page_size=10).execute()
+        self.assertEqual(response['results'], self.records[:10])
+
+    def test_compact_records_json(self):
+        import json
+        import mock
+        from solvebio import SolveClient
+        from solvebio.annotate import AnnotationCache
+        from solvebio.utils.jsonutils import json_default
+        from solvebio.utils.recordfile import RecordFile
+
+        records = list(Query(1, client=self.client, page_size=10,
+                             result_class=CompactRecord))
+        self.assertEqual(json.loads(json.dumps(records, default=json_default)),
+                         self.records)
+        with self.assertRaises(TypeError):
+            json.dumps(object(), default=json_default)
+
+        # Records are sent to the API as JSON objects
+        class FakeResponse(object):
+            status_code = 201
+            headers = {}
+
+            def json(self):
+                return {'id': 100, 'class_name': 'DatasetImport',
+                        'status': 'queued'}
+
+        client = SolveClient(host='http://localhost', token='token')
+        with mock.patch('solvebio.client.Session.request') as Request:
+            Request.return_value = FakeResponse()
+            imports = client.DatasetImport.create_from_records(
+                1, records, chunk_size=10)
+        self.assertEqual(len(imports), 3)
+        sent = [json.loads(c[1]['data'])['data_records']
+                for c in Request.call_args_list]
+        self.assertEqual(sorted(sum(sent, []), key=lambda r: r['position']),
+                         self.records)
+
+        # Annotation cache keys don't depend on the record type
+        self.assertEqual(
+            AnnotationCache.make_key(records[3], [{'name': 'n'}]),
+            AnnotationCache.make_key(self.records[3], [{'name': 'n'}]))
+
+        with RecordFile() as record_file:
+            record_file.extend(records)
+            self.assertEqual(list(record_file), self.records)
+
+    def test_materialize(self):
+        import os
+
+        query = Query(1, client=self.client, page_size=10)
+        records = query.materialize()
+        n_requests = len(self.client.requests)
+
+        self.assertEqual(len(records), 25)
+        self.assertEqual(list(records), self.records)
+        self.assertEqual(list(records), self.records)
+        self.assertEqual(records[7], self.records[7])
+        self.assertEqual(records[-1], self.records[-1])
+        self.assertEqual(records[5:8], self.records[5:8])
+        with self.assertRaises(IndexError):
+            records[25]
+        # No additional requests are made
+        self.assertEqual(len(self.client.requests), n_requests)
+
+        path = records.path
+        records.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_materialize_path(self):
+        import os
+        import tempfile
+        from solvebio.utils.recordfile import RecordFile
+
+        path = os.path.join(tempfile.mkdtemp(), 'results.records')
+        query = Query(1, client=self.client, page_size=10,
+                      result_class=CompactRecord)
+        with query[5:15].materialize(path) as records:
+            self.assertEqual(len(records), 10)
+            self.assertTrue(isinstance(records[0], CompactRecord))
+            self.assertEqual(records[0].to_dict(), self.records[5])
+
+        # Existing files are re-indexed when opened
+        with RecordFile(path) as records:
+            self.assertEqual(list(records), self.records[5:15])
+            records.append({'position': 100})
+            self.assertEqual(records[-1], {'position': 100})
+
+        os.remove(path)
+
+    def test_hash_join(self):
+        genes = [
+            {'symbol': 'GENE0', 'name': 'first'},
+            {'symbol': 'GENE1', 'name': 'second'},
+            {'symbol': 'GENE1', 'name': 'second (alt)'},
+        ]
+        client = FakeQueryClient({'A': self.records, 'B': genes})
+        query_a = Query('A', client=client, page_size=10)
+        query_b = Query('B', client=client)
+
+        results = list(query_a.hash_join(query_b, key='gene', key_b='symbol',
+                                         keys_per_query=1))
+        # GENE0 matches once, GENE1 twice and GENE2 is not matched
+        self.assertEqual(len(results), 9 + 2 * 8 + 8)
+        self.assertEqual(results[0], dict(self.records[0], b_symbol='GENE0', b_name='first'))
+        self.assertEqual([r['b_name'] for r in results[1:3]], ['second', 'second (alt)'])
+        self.assertEqual(results[3], self.records[2])
+
+        # Batches of 10 records of A (its page size), with one request
+        # per key (keys_per_query) in each batch
+        b_requests = [d for url, d in client.requests if url == '/v2/datasets/B/data']
+        self.assertEqual(len(b_requests), 3 * 3)
+        self.assertEqual(b_requests[0]['filters'], [('symbol__in', ['GENE0'])])
+
+        # Only prefix fields that already exist in A
+        results = list(query_a[:1].hash_join(query_b, key='gene', key_b='symbol',
+                                             always_prefix=False))
+        self.assertEqual(results, [dict(self.records[0], symbol='GENE0', name='first')])
+
+    def test_hash_join_concurrency(self):
+        import threading
+        import time
+
+        genes = [{'symbol': 'GENE{0}'.format(i)} for i in range(3)]
+        lock = threading.Lock()
+        active = [0, 0]
+
+        class SlowClient(FakeQueryClient):
+            def post(self, url, data, **kwargs):
+                if url != '/v2/datasets/B/data':
+                    return super(SlowClient, self).post(url, data, **kwargs)
+                with lock:
+                    active[0] += 1
+                    active[1] = max(active)
+                time.sleep(0.05)
+                try:
+                    return super(SlowClient, self).post(url, data, **kwargs)
+                finally:
+                    with lock:
+                        active[0] -= 1
+
+        client = SlowClient({'A': self.records, 'B': genes})
+        query_a = Query('A', client=client, page_size=5)
+        query_b = Query('B', client=client)
+        results = list(query_a.hash_join(query_b, key='gene', key_b='symbol',
+                                         concurrency=3))
+        self.assertEqual([r['b_symbol'] for r in results],
+                         [r['gene'] for r in self.records])
+
+        # With the default keys_per_query, the keys of each batch are
+        # still split between the workers, and the queries of B overlap
+        b_requests = [d for url, d in client.requests if url == '/v2/datasets/B/data']
+        self.assertEqual(len(b_requests), 3)
+        self.assertTrue(all(len(d['filters'][0][1]) == 1 for d in b_requests))
+        self.assertEqual(active[1], 3)
+
+    def test_batch_query(self):
+        queries = [Query(1, client=self.client, limit=i + 1, page_size=4)
+                   for i in range(25)]
+        queries.append(Query(1, client=self.client).filter(gene='GENE1'))
+
+        results = BatchQuery(queries, batch_size=10, client=self.client).execute()
+        self.assertEqual(len(self.client.requests), 3)
+        self.assertEqual(len(results), 26)
+        self.assertEqual(results[0]['results'], self.records[:1])
+        self.assertEqual(results[24]['results'], self.records[:4])
+        self.assertEqual(len(results[25]['results']), 8)
+
+        self.client.requests = []
+        results = BatchQuery(queries, batch_size=10, client=self.client).execute(all_pages=True)
+        for i, response in enumerate(results[:25]):
+            self.assertEqual(response['results'], self.records[:i + 1])
+        self.assertEqual(results[25]['results'], self.records[1::3])
+        # 26 first pages, 21 second pages, ... 5 seventh pages
+        self.assertEqual(len(self.client.requests), 3 + 3 + 2 + 2 + 1 + 1 + 1)
@@ -0,0 +1,186 @@
+from __future__ import absolute_import
+
+import unittest
+
+import mock
+
+from solvebio.resource.solveobject import convert_to_solve_object
+
+
+class FakeList(list):
+    def solve_objects(self):
+        return self
+
+
+class FakeServer(object):
+    """Returns the next state of each task on each request"""
+
+    def __init__(self, class_name, states):
+        self.class_name = class_name
+        self.states = dict((_id, list(values)) for _id, values in states.items())
+        self.requests = []
+
+    def obj(self, _id, state):
+        values = dict(id=_id, class_name=self.class_name)
+        values.update(state)
+        return convert_to_solve_object(values)
+
+    def all(self, **params):
+        ids = [int(i) for i in params['id__in'].split(',')]
+        self.requests.append(ids)
+        return FakeList(self.obj(_id, self.states[_id].pop(0))
+                        for _id in ids if self.states[_id])
+
+    def task(self, _id):
+        return self.obj(_id, self.states[_id].pop(0))
+
+
+class TaskMonitorTests(unittest.TestCase):
+
+    def _monitor(self, tasks, **kwargs):
+        from solvebio import TaskMonitor
+        self.events = []
+        return TaskMonitor(tasks, callback=self.events.append,
+                           min_sleep=1, max_sleep=8, backoff=2, **kwargs)
+
+    @mock.patch('solvebio.resource.taskmonitor.time.sleep')
+    @mock.patch('solvebio.resource.DatasetCommit.all')
+    @mock.patch('solvebio.resource.DatasetImport.all')
+    def test_wait(self, ImportAll, CommitAll, Sleep):
+        commit = {'id': 10, 'class_name': 'DatasetCommit',
+                  'status': 'queued'}
+        imports = FakeServer('DatasetImport', {
+            1: [{'status': 'running'},
+                {'status': 'completed', 'dataset_commits': [commit]}],
+            2: [{'status': 'running'},
+                {'status': 'completed', 'dataset_commits': []}],
+        })
+        commits = FakeServer('DatasetCommit', {
+            10: [{'status': 'running', 'records_modified': 5,
+                  'records_total': 10},
+                 {'status': 'running', 'records_modified': 5,
+                  'records_total': 10},
+                 {'status': 'running', 'records_modified': 5,
+                  'records_total': 10},
+                 {'status': 'completed', 'records_modified': 10,
+                  'records_total': 10}],
+        })
+        ImportAll.side_effect = imports.all
+        CommitAll.side_effect = commits.all
+
+        tasks = [imports.obj(1, {'status': 'queued'}),
+                 imports.obj(2, {'status': 'queued'})]
+        monitor = self._monitor(tasks)
+        results = monitor.wait()
+
+        # One request per tick for all the imports
+        self.assertEqual(imports.requests, [[1, 2], [1, 2]])
+        self.assertEqual(commits.requests, [[10]] * 4)
+        self.assertEqual(results[:2], tasks)
+        self.assertEqual([t.status for t in results],
+                         ['completed', 'completed', 'completed'])
+        self.assertTrue(monitor.done)
+
+        # The commit of the first import is followed
+        self.assertEqual(results[2].__class__.__name__, 'DatasetCommit')
+        self.assertEqual(
+            [(e.task.id, e.status, e.previous_status, e.progress)
+             for e in self.events],
+            [(1, 'queued', None, None),
+             (2, 'queued', None, None),
+             (1, 'running', 'queued', None),
+             (2, 'running', 'queued', None),
+             (1, 'completed', 'running', None),
+             (10, 'queued', None, None),
+             (2, 'completed', 'running', None),
+             (10, 'running', 'queued', (5, 10)),
+             (10, 'completed', 'running', (10, 10))])
+
+        # Backs off while nothing changes
+        self.assertEqual([c[0][0] for c in Sleep.call_args_list],
+                         [1, 1, 1, 1, 2, 4])
+
+    @mock.patch('solvebio.resource.taskmonitor.time.sleep')
+    @mock.patch('solvebio.resource.DatasetImport.retrieve')
+    @mock.patch('solvebio.resource.DatasetImport.all')
+    def test_poll(self, ImportAll, ImportRetrieve, Sleep):
+        from solvebio import TaskMonitor
+
+        states = dict((i, [{'status': 'completed'}]) for i in range(250))
+        imports = FakeServer('DatasetImport', states)
+        ImportAll.side_effect = imports.all
+        # Tasks missing from the list are retrieved
+        imports.states[42] = []
+        ImportRetrieve.side_effect = \
+            lambda _id, **kwargs: imports.obj(_id, {'status': 'failed'})
+
+        monitor = self._monitor(
+            [imports.obj(i, {'status': 'queued'}) for i in range(250)],
+            follow_commits=False)
+        events = monitor.poll()
+
+        self.assertEqual([len(r) for r in imports.requests],
+                         [TaskMonitor.BATCH_SIZE, TaskMonitor.BATCH_SIZE, 50])
+        self.assertEqual(ImportRetrieve.call_count, 1)
+        self.assertEqual(len(events), 250)
+        self.assertEqual(monitor.tasks[(events[0].task.__class__, 42)].status,
+                         'failed')
+        self.assertTrue(monitor.done)
+        self.assertFalse(monitor.poll())
+        self.assertFalse(Sleep.called)
+
+    @mock.patch('solvebio.resource.taskmonitor.time.sleep')
+    @mock.patch('solvebio.resource.DatasetImport.retrieve')
+    @mock.patch('solvebio.resource.DatasetImport.all')
+    def test_ignored_filter(self, ImportAll, ImportRetrieve, Sleep):
+        imports = FakeServer('DatasetImport', {
+            1: [{'status': 'running'}, {'status': 'completed'}],
+            2: [{'status': 'completed'}],
+        })
+        # The endpoint ignores id__in and lists other imports
+        ImportAll.return_value = FakeList(
+            [imports.obj(3, {'status': 'completed'})])
+        ImportRetrieve.side_effect = lambda _id, **kwargs: imports.task(_id)
+
+        monitor = self._monitor(
+            [imports.obj(i, {'status': 'queued'}) for i in (1, 2)])
+        monitor.wait()
+
+        # Detected once, then the imports are retrieved individually
+        self.assertEqual(ImportAll.call_count, 1)
+        self.assertEqual([c[0][0] for c in ImportRetrieve.call_args_list],
+                         [1, 2, 1])
+        self.assertEqual([t.status for t in monitor.tasks.values()],
+                         ['completed', 'completed'])
+
+    @mock.patch('solvebio.resource.taskmonitor.time.sleep')
+    @mock.patch('solvebio.resource.DatasetCommit.all')
+    @mock.patch('solvebio.resource.DatasetImport.all')
+    def test_new_commits(self, ImportAll, CommitAll, Sleep):
+        def _commit(_id):
+            return {'id': _id, 'class_name': 'DatasetCommit',
+                    'status': 'running'}
+
+        imports = FakeServer('DatasetImport', {
+            1: [{'status': 'running', 'dataset_commits': [_commit(10)]},
+                {'status': 'running',
+                 'dataset_commits': [_commit(10), _commit(11)]},
+                {'status': 'completed',
+                 'dataset_commits': [_commit(10), _commit(11)]}],
+        })
+        commits = FakeServer('DatasetCommit', {
+            10: [{'status': 'completed'}] * 3,
+            11: [{'status': 'completed'}] * 2,
+        })
+        ImportAll.side_effect = imports.all
+        CommitAll.side_effect = commits.all
+
+        monitor = self._monitor([imports.obj(1, {'status': 'queued'})])
+        results = monitor.wait()
+
+        # Commits created while the import runs are followed too
+        self.assertEqual([(t.__class__.__name__, t.id) for t in results],
+                         [('DatasetImport', 1), ('DatasetCommit', 10),
+                          ('DatasetCommit', 11)])
+        self.assertEqual(commits.requests, [[10], [11]])
+        self.assertTrue(monitor.done)
@@ -1,8 +1,10 @@
 from __future__ import absolute_import
 import os
+import unittest
 
 from .helper import SolveBioTestCase
 from solvebio.utils.files import check_gzip_path
+from solvebio.utils.concurrency import imap_ordered
 
 
 class GzipTest(SolveBioTestCase):
@@ -20,3 +22,85 @@ class GzipTest(SolveBioTestCase):
                          'test_export.xlsx']:
             path = os.path.join(path, non_gzip)
             self.assertFalse(check_gzip_path(path), path)
+
+
+class ConcurrencyTest(unittest.TestCase):
+
+    def test_imap_ordered(self):
+        import time
+
+        def _slow_square(i):
+            # Make earlier items finish last
+            time.sleep(0.001 * (10 - i))
+            return i * i
+
+        for workers in (1, 4):
+            self.assertEqual(
+                list(imap_ordered(_slow_square, range(10), workers=workers)),
+                [i * i for i in range(10)])
+
+    def test_imap_ordered_is_lazy(self):
+        consumed = []
+
+        def _items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        results = imap_ordered(lambda x: x, _items(), workers=2,
+                               max_pending=4)
+        self.assertEqual(next(results), 0)
+        self.assertTrue(len(consumed) <= 5)
+        results.close()
+
+
+class GenomicIndexTest(unittest.TestCase):
+
+    def test_genomic_index(self):
+        import pickle
+        import random
+        from solvebio import GenomicFilter
+        from solvebio.utils.genomicindex import GenomicIndex
+        from solvebio.utils.recordfile import RecordFile
+
+        random.seed(0)
+        records = []
+        for i in range(500):
+            start = random.randint(1, 1000)
+            records.append({
+                'id': i,
+                'genomic_coordinates': {
+                    'chromosome': random.choice(['1', '2', 'X']),
+                    'start': start,
+                    'stop': start + random.choice([0, 0, 5, 50, 300])
+                }
+            })
+        records.append({'id': 500, 'genomic_coordinates': {}})
+
+        index = GenomicIndex(iter(records))
+        self.assertEqual(len(index), 500)
+
+        for _ in range(200):
+            chromosome = random.choice(['chr1', '2', 'X', 'Y'])
+            start = random.randint(1, 1100)
+            stop = start + random.choice([0, 10, 100])
+            exact = random.random() < 0.2
+
+            predicate = GenomicFilter(chromosome, start, stop, exact=exact).compile()
+            expected = set(r['id'] for r in records if predicate(r))
+            results = index.range(chromosome, start, stop, exact=exact)
+            self.assertEqual(set(r['id'] for r in results), expected)
+            self.assertEqual(len(results), len(expected))
+
+            predicate = GenomicFilter(chromosome, start).compile()
+            self.assertEqual(set(r['id'] for r in index.position(chromosome, start)),
+                             set(r['id'] for r in records if predicate(r)))
+
+        # Indexes over record files are pickled by path
+        with RecordFile() as record_file:
+            record_file.extend(records)
+            index = GenomicIndex(record_file)
+            copy = pickle.loads(pickle.dumps(index))
+            self.assertEqual(copy.range('1', 100, 200), index.range('1', 100, 200))
+            self.assertEqual(copy.records.path, record_file.path)
+            copy.records.close()
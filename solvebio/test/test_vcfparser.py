@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 import os
 import io
+import unittest
 
 from .helper import SolveBioTestCase
 
@@ -53,3 +54,405 @@ class VCFParserTest(SolveBioTestCase):
             self.assertEqual(len(row['allele']), 1)
 
         parser.close()
+
+
+class FastVCFReaderTest(unittest.TestCase):
+
+    def _paths(self):
+        data = os.path.join(os.path.dirname(__file__), 'data')
+        return [os.path.join(data, f) for f in
+                ('sample.vcf.gz', 'sample2.vcf', 'sample_snpeff.vcf')]
+
+    def test_fast_reader(self):
+        from solvebio.contrib.vcf_parser.vcf_parser import ExpandingVCFParser
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+
+        path = self._paths()[2]
+        rows = list(ExpandingVCFParser(filename=path, reader_class=FastVCFReader))
+        self.assertEqual(len(rows), 101)
+        self.assertEqual(set(rows[0].keys()), set(VCFParserTest.expected_fields))
+
+        # Multi-allelic rows are expanded
+        self.assertEqual(rows[0]['alternate_alleles'], ['T', 'TTA', 'A'])
+        self.assertEqual(sorted(r['allele'] for r in rows[:3]), ['A', 'T', 'TTA'])
+        self.assertEqual(rows[0]['filter'], ['LowQual', 'q10'])
+
+        info = rows[0]['info']
+        self.assertEqual(info['DP'], 120)
+        self.assertEqual(info['AF'], [None, None, None])
+        self.assertEqual(info['DB'], True)
+        self.assertEqual(info['ANN'][0]['Annotation'], ['downstream_gene_variant'])
+        self.assertEqual(info['ANN'][0]['HGVS_p'], None)
+
+        with io.open(path, 'rb') as f:
+            parser = ExpandingVCFParser(fsock=f, reader_class=FastVCFReader)
+            self.assertEqual(list(parser), rows)
+
+    def test_info_headers(self):
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+
+        header = (
+            '##fileformat=VCFv4.2\n'
+            '##INFO=<ID=DP,Type=Integer,Number=1,Description="Depth, total">\n'
+            '##INFO=<ID=AF,Number=A,Type=Float,Description="Frequency",IDX=3>\n'
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+        row = '1\t100\t.\tA\tC,G\t.\t.\tDP=12;AF=0.5,0.25\n'
+        reader = FastVCFReader(fsock=io.StringIO(header + row))
+        # Lines with attributes in another order (or extra attributes)
+        # keep their types and numbers
+        self.assertEqual(reader.infos['DP'].num, 1)
+        self.assertEqual(reader.infos['DP'].desc, 'Depth, total')
+        self.assertEqual(reader.infos['AF'].type, 'Float')
+        self.assertEqual(next(reader).INFO, {'DP': 12, 'AF': [0.5, 0.25]})
+
+        malformed = '##INFO=<ID=DP,Number=1,Description="Depth">\n'
+        self.assertRaises(SyntaxError, FastVCFReader,
+                          fsock=io.StringIO(malformed + row))
+
+    def test_ann_parser(self):
+        from solvebio.contrib.vcf_parser.vcf_parser import ExpandingVCFParser
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+        from solvebio.contrib.vcf_parser.snpeff import AnnParser
+
+        path = self._paths()[2]
+        rows = list(ExpandingVCFParser(filename=path, reader_class=FastVCFReader))
+        columns = list(ExpandingVCFParser(filename=path, reader_class=FastVCFReader,
+                                          ann_columns=True))
+        self.assertEqual(len(columns), len(rows))
+        parser_fields = rows[0]['info']['ANN'][0].keys()
+        for row, column_row in zip(rows, columns):
+            ann, ann_columns = row['info']['ANN'], column_row['info']['ANN']
+            self.assertEqual(sorted(ann_columns.keys()), sorted(parser_fields))
+            for key, values in ann_columns.items():
+                self.assertEqual(values, [a[key] for a in ann])
+
+        parser = AnnParser(['Allele', 'Annotation', 'Gene_Name'])
+        self.assertEqual(parser(['A|missense_variant&splice_region_variant|', 'T||TP53']),
+                         [{'Allele': 'A', 'Gene_Name': None,
+                           'Annotation': ['missense_variant', 'splice_region_variant']},
+                          {'Allele': 'T', 'Annotation': None, 'Gene_Name': 'TP53'}])
+        # Annotations with missing values
+        self.assertEqual(parser(['A|intron_variant', 'T||TP53|extra']),
+                         [{'Allele': 'A', 'Annotation': ['intron_variant']},
+                          {'Allele': 'T', 'Annotation': None, 'Gene_Name': 'TP53'}])
+        self.assertEqual(AnnParser(parser.fields, columns=True)(['A|intron_variant', 'T||TP53']),
+                         {'Allele': ['A', 'T'], 'Annotation': [['intron_variant'], None],
+                          'Gene_Name': [None, 'TP53']})
+
+    def test_ann_parser_snpeff_output(self):
+        from solvebio.contrib.vcf_parser.snpeff import AnnParser
+
+        # ANN values produced by SnpEff (hg38)
+        description = (
+            "Functional annotations: 'Allele | Annotation | Annotation_Impact | "
+            "Gene_Name | Gene_ID | Feature_Type | Feature_ID | Transcript_BioType | "
+            "Rank | HGVS.c | HGVS.p | cDNA.pos / cDNA.length | CDS.pos / CDS.length | "
+            "AA.pos / AA.length | Distance | ERRORS / WARNINGS / INFO'")
+        ann = ('A|synonymous_variant|LOW|CDH2|CDH2|transcript|NM_001792.4|'
+               'protein_coding|15/16|c.2448C>T|p.Ala816Ala|2872/4335|2448/2721|'
+               '816/906||,'
+               'A|synonymous_variant|LOW|CDH2|CDH2|transcript|NM_001308176.1|'
+               'protein_coding|14/15|c.2355C>T|p.Ala785Ala|2392/3855|2355/2628|'
+               '785/875||').split(',')
+        parser = AnnParser.from_description(description)
+        parsed = parser(ann)
+        self.assertEqual(parsed, [parser._parse_entry_fallback(a) for a in ann])
+        self.assertEqual(parsed[1]['Feature_ID'], 'NM_001308176.1')
+        self.assertEqual(parsed[1]['CDS_pos_CDS_length'], '2355/2628')
+        self.assertEqual(parsed[1]['Annotation'], ['synonymous_variant'])
+        self.assertEqual(parsed[1]['ERRORS_WARNINGS_INFO'], None)
+        # Truncated annotations only have the keys with values
+        self.assertEqual(parser(['A|intron_variant|MODIFIER|CDH2']),
+                         [{'Allele': 'A', 'Annotation': ['intron_variant'],
+                           'Annotation_Impact': 'MODIFIER', 'Gene_Name': 'CDH2'}])
+
+    def test_fast_reader_matches_pyvcf(self):
+        try:
+            import vcf  # noqa
+        except ImportError:
+            self.skipTest('PyVCF is not installed')
+
+        from solvebio.contrib.vcf_parser.vcf_parser import ExpandingVCFParser
+        from solvebio.contrib.vcf_parser.vcf_parser import VCFReader
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+
+        for path in self._paths():
+            expected = list(ExpandingVCFParser(filename=path, reader_class=VCFReader))
+            rows = list(ExpandingVCFParser(filename=path, reader_class=FastVCFReader))
+            self.assertEqual(rows, expected, path)
+
+        # Empty values are missing (None), as in PyVCF
+        import tempfile
+        header = (
+            '##fileformat=VCFv4.1\n'
+            '##INFO=<ID=S,Number=.,Type=String,Description="S">\n'
+            '##INFO=<ID=S1,Number=1,Type=String,Description="S1">\n'
+            '##INFO=<ID=AF,Number=A,Type=Float,Description="AF">\n'
+            '##INFO=<ID=FL,Number=.,Type=Float,Description="FL">\n'
+            '##INFO=<ID=DP,Number=1,Type=Integer,Description="DP">\n'
+            '##INFO=<ID=IL,Number=.,Type=Integer,Description="IL">\n'
+            '##INFO=<ID=F1,Number=1,Type=Float,Description="F1">\n'
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+        rows = [
+            'S=a,,b;DP=;IL=1,,2;F1=',
+            'FL=0.1,,0.2;S1=;X=;MQ=',
+            'AF=0.1,;IL=,;S=,',
+        ]
+        data = header + ''.join(
+            '1\t{0}\t.\tA\tC,G\t.\tPASS\t{1}\n'.format(i + 1, info)
+            for i, info in enumerate(rows))
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.vcf', delete=False) as f:
+            f.write(data)
+        try:
+            expected = list(ExpandingVCFParser(filename=f.name, reader_class=VCFReader))
+            rows = list(ExpandingVCFParser(filename=f.name, reader_class=FastVCFReader))
+            self.assertEqual(rows, expected)
+            self.assertEqual(rows[0]['info']['S'], ['a', None, 'b'])
+            self.assertEqual(rows[0]['info']['DP'], None)
+            self.assertEqual(rows[2]['info']['FL'], [0.1, None, 0.2])
+        finally:
+            os.remove(f.name)
+
+
+def write_bgzf(path, data, block_size=65280):
+    """
+    Writes data to a BGZF file, in blocks of block_size bytes.
+    Returns the virtual offsets of each line.
+    """
+    import struct
+    import zlib
+
+    block_offsets = []
+    with open(path, 'wb') as f:
+        blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+        # The last, empty block marks the end of the file
+        for block in blocks + [b'']:
+            block_offsets.append(f.tell())
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            cdata = compressor.compress(block) + compressor.flush()
+            f.write(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00')
+            f.write(struct.pack('<H', len(cdata) + 25))
+            f.write(cdata)
+            f.write(struct.pack('<2I', zlib.crc32(block) & 0xffffffff, len(block)))
+
+    offsets = []
+    position = 0
+    for line in data.splitlines(True):
+        offsets.append((block_offsets[position // block_size] << 16) | (position % block_size))
+        position += len(line)
+
+    return offsets
+
+
+def write_tabix(path, data, block_size=65280):
+    """Writes a sorted VCF to a BGZF file, with a tabix index."""
+    import gzip
+    import struct
+
+    from solvebio.contrib.vcf_parser.bgzf import region_to_bin
+
+    offsets = write_bgzf(path, data, block_size)
+    lines = data.splitlines(True)
+    names, refs = [], {}
+    for i, line in enumerate(lines):
+        if line.startswith(b'#'):
+            continue
+        chrom, pos, _, ref = line.split(b'\t')[:4]
+        if chrom not in refs:
+            names.append(chrom)
+            refs[chrom] = ({}, [])
+        bins, linear = refs[chrom]
+
+        start, end = int(pos) - 1, int(pos) - 1 + len(ref)
+        next_offset = offsets[i + 1] if i + 1 < len(lines) else \
+            offsets[i] + len(line)
+        bins.setdefault(region_to_bin(start, end), []).append((offsets[i], next_offset))
+        for window in range(start >> 14, ((end - 1) >> 14) + 1):
+            linear.extend([None] * (window + 1 - len(linear)))
+            if linear[window] is None:
+                linear[window] = offsets[i]
+
+    names_data = b''.join(name + b'\x00' for name in names)
+    index = [b'TBI\x01', struct.pack('<8i', len(names), 2, 1, 2, 0, ord('#'), 0, len(names_data)),
+             names_data]
+    for name in names:
+        bins, linear = refs[name]
+        index.append(struct.pack('<i', len(bins)))
+        for bin_number, chunks in sorted(bins.items()):
+            index.append(struct.pack('<Ii', bin_number, len(chunks)))
+            for chunk in chunks:
+                index.append(struct.pack('<2Q', *chunk))
+        # Windows without records point to the next record
+        for window in reversed(range(len(linear) - 1)):
+            if linear[window] is None:
+                linear[window] = linear[window + 1]
+        index.append(struct.pack('<i', len(linear)))
+        index.append(struct.pack('<{0}Q'.format(len(linear)), *linear))
+
+    with gzip.open(path + '.tbi', 'wb') as f:
+        f.write(b''.join(index))
+
+
+def sorted_vcf(path):
+    """Returns the contents of a VCF file, sorted by position."""
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines(True)
+    header = [line for line in lines if line.startswith(b'#')]
+    body = [line for line in lines if not line.startswith(b'#')]
+    body.sort(key=lambda line: (line.split(b'\t')[0], int(line.split(b'\t')[1])))
+    return b''.join(header + body)
+
+
+class ParallelVCFParserTest(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir)
+
+    def test_parallel_parser(self):
+        from solvebio.contrib.vcf_parser.vcf_parser import ExpandingVCFParser
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+
+        source = os.path.join(os.path.dirname(__file__), 'data', 'sample_snpeff.vcf')
+        path = os.path.join(self.tmpdir, 'sample_snpeff.vcf.gz')
+        with open(source, 'rb') as f:
+            # Small blocks, so that most lines span multiple blocks
+            write_bgzf(path, f.read(), block_size=700)
+
+        def parse(**kwargs):
+            parser = ExpandingVCFParser(filename=path, reader_class=FastVCFReader, **kwargs)
+            rows, line_numbers = [], []
+            for row in parser:
+                rows.append(row)
+                line_numbers.append(parser._line_number)
+            parser.close()
+            return rows, line_numbers
+
+        expected, expected_line_numbers = parse()
+        self.assertEqual(len(expected), 101)
+
+        for chunk_size in (1, 2000, 10 ** 6):
+            rows, line_numbers = parse(processes=2, chunk_size=chunk_size)
+            self.assertEqual(rows, expected)
+            self.assertEqual(line_numbers, expected_line_numbers)
+
+            rows, line_numbers = parse(processes=2, chunk_size=chunk_size, ordered=False)
+            self.assertEqual(sorted(rows, key=repr), sorted(expected, key=repr))
+            self.assertEqual(line_numbers[-1], expected_line_numbers[-1])
+
+        # With a tabix index, chunks start on record boundaries
+        path = os.path.join(self.tmpdir, 'sorted.vcf.gz')
+        write_tabix(path, sorted_vcf(source), block_size=700)
+        expected, expected_line_numbers = parse()
+        for chunk_size in (1, 2000, 10 ** 6):
+            rows, line_numbers = parse(processes=2, chunk_size=chunk_size)
+            self.assertEqual(rows, expected)
+            self.assertEqual(line_numbers, expected_line_numbers)
+
+        # Parallel parsing requires a BGZF file
+        with self.assertRaises(Exception):
+            list(ExpandingVCFParser(filename=source, processes=2))
+
+
+class FetchVCFParserTest(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(os.path.dirname(__file__), 'data', 'sample_snpeff.vcf')
+        self.data = sorted_vcf(self.source)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir)
+
+    def _paths(self):
+        # Tabix-indexed, BGZF-compressed and uncompressed files
+        paths = [os.path.join(self.tmpdir, f) for f in
+                 ('tabix.vcf.gz', 'bgzf.vcf.gz', 'plain.vcf')]
+        write_tabix(paths[0], self.data, block_size=700)
+        write_bgzf(paths[1], self.data, block_size=700)
+        with open(paths[2], 'wb') as f:
+            f.write(self.data)
+        return paths
+
+    def test_fetch(self):
+        from solvebio.contrib.vcf_parser.vcf_parser import ExpandingVCFParser
+        from solvebio.contrib.vcf_parser.fast_reader import FastVCFReader
+        from solvebio.contrib.vcf_parser.index import TabixIndex, PositionIndex
+
+        def overlaps(row, chromosome, start, stop):
+            coordinates = row['genomic_coordinates']
+            return coordinates['chromosome'] == chromosome and \
+                coordinates['start'] <= stop and coordinates['stop'] >= start
+
+        for path in self._paths():
+            parser = ExpandingVCFParser(filename=path, reader_class=FastVCFReader)
+            rows = list(ExpandingVCFParser(filename=path, reader_class=FastVCFReader))
+            self.assertEqual(len(rows), 101)
+            index_class = TabixIndex if path.endswith('tabix.vcf.gz') else PositionIndex
+            self.assertIsInstance(parser.index, index_class)
+
+            for chromosome, start, stop in [('1', 16219, 16219), ('1', 20000, 60000),
+                                            ('2', 1, 10 ** 6), ('X', 30600, 30601),
+                                            ('X', 140000, 150000), ('3', 1, 1000)]:
+                expected = [r for r in rows if overlaps(r, chromosome, start, stop)]
+                self.assertEqual(list(parser.fetch(chromosome, start, stop)), expected)
+                self.assertEqual(
+                    list(parser.fetch('chr{0}:{1}-{2}'.format(chromosome, start, stop))),
+                    expected)
+
+            # Deletions overlapping with the start of the region are included
+            fetched = list(parser.fetch('X:30601'))
+            self.assertEqual([r['genomic_coordinates']['start'] for r in fetched], [30599])
+            self.assertEqual(list(parser.fetch('X:30601', exact=True)), [])
+            self.assertEqual(len(list(parser.fetch('X', 30599, 30601, exact=True))), 1)
+
+            # Whole chromosomes
+            self.assertEqual(list(parser.fetch('chr1')),
+                             [r for r in rows if r['genomic_coordinates']['chromosome'] == '1'])
+
+            # Overlapping regions are merged
+            fetched = list(parser.fetch_regions(['1:11000-17000', 'chr1:16000-24000', ('2', 14339)]))
+            expected = [r for r in rows if overlaps(r, '1', 11000, 24000) or
+                        overlaps(r, '2', 14339, 14339)]
+            self.assertEqual(fetched, expected)
+
+            # Closing a fetched parser closes its file
+            import mock
+            opened = []
+
+            def _open(*args, **kwargs):
+                opened.append(io.open(*args, **kwargs))
+                return opened[-1]
+
+            with mock.patch('solvebio.contrib.vcf_parser.vcf_parser.open',
+                            _open, create=True):
+                fetched = parser.fetch('chr1')
+                next(fetched)
+            fetched.close()
+            self.assertTrue(opened)
+            self.assertTrue(all(f.closed for f in opened))
+
+            # Fetching does not change the position of the parser
+            self.assertEqual(next(parser), rows[0])
+            self.assertEqual(parser._line_number, 0)
+            parser.close()
+
+    def test_position_index_cache(self):
+        from solvebio.contrib.vcf_parser.index import PositionIndex
+
+        path = self._paths()[1]
+        index = PositionIndex.open(path)
+        self.assertTrue(os.path.exists(path + '.sbi'))
+        cached = PositionIndex.open(path)
+        self.assertEqual(cached.chromosomes, index.chromosomes)
+        self.assertEqual(cached.chunks('chr2', 20000, 30000), index.chunks('2', 20000, 30000))
+
+        # Unsorted files cannot be indexed
+        with self.assertRaises(Exception):
+            PositionIndex.build(self.source)
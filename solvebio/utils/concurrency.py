@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Small thread-pool helpers for running API requests concurrently."""
+from __future__ import absolute_import
+
+import collections
+from multiprocessing.pool import ThreadPool
+
+# Default number of worker threads used by concurrent helpers.
+DEFAULT_WORKERS = 4
+
+
+def imap_ordered(func, iterable, workers=DEFAULT_WORKERS, max_pending=None):
+    """
+    Calls `func` on each item of `iterable` using a pool of threads,
+    yielding the results in input order.
+
+    The input is consumed lazily: at most `max_pending` calls
+    (by default, twice the number of workers) are in flight at once,
+    so slow consumers apply backpressure to the input iterable.
+
+    With `workers` <= 1 the calls are made serially in the calling thread.
+    Exceptions raised by `func` are re-raised when their result is reached.
+    """
+    if not workers or workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    max_pending = max(max_pending or 2 * workers, 1)
+    pool = ThreadPool(workers)
+    pending = collections.deque()
+    try:
+        for item in iterable:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+def map_ordered(func, iterable, workers=DEFAULT_WORKERS):
+    """Like `imap_ordered` but returns a list of results."""
+    return list(imap_ordered(func, iterable, workers=workers))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import bisect
+from array import array
+
+from ..query import GenomicFilter
+
+
+class GenomicIndex(object):
+    """
+    An in-memory interval index over records with genomic coordinates
+    (i.e. locally materialized query results), answering range and
+    position lookups without scanning all the records.
+
+    For each chromosome, intervals are stored in arrays sorted by
+    start position, along with the running maximum of the stop
+    positions, so that overlaps are found with binary searches.
+
+    Lookups use the same semantics as `GenomicFilter`: by default,
+    records overlapping with the position or range are returned,
+    or only exact matches with `exact`.
+
+    Records can be any sequence (a list or a `RecordFile`), other
+    iterables (such as a Query) are loaded into a list. The index is
+    picklable; a RecordFile is pickled by path.
+    """
+
+    def __init__(self, records):
+        if not hasattr(records, '__getitem__') or \
+                not hasattr(records, '__len__'):
+            records = list(records)
+
+        self.records = records
+        self._chromosomes = {}
+        self._build()
+
+    @staticmethod
+    def _coordinates(record):
+        coordinates = record
+        for key in GenomicFilter.FIELD_CHR.split('.')[:-1]:
+            coordinates = (coordinates or {}).get(key)
+        return coordinates or {}
+
+    def _build(self):
+        field_chr = GenomicFilter.FIELD_CHR.split('.')[-1]
+        field_start = GenomicFilter.FIELD_START.split('.')[-1]
+        field_stop = GenomicFilter.FIELD_STOP.split('.')[-1]
+
+        intervals = {}
+        for i, record in enumerate(self.records):
+            coordinates = self._coordinates(record)
+            chromosome = coordinates.get(field_chr)
+            start = coordinates.get(field_start)
+            if chromosome is None or start is None:
+                continue
+
+            stop = coordinates.get(field_stop)
+            if stop is None:
+                stop = start
+            chromosome = str(chromosome).replace('chr', '')
+            intervals.setdefault(chromosome, []).append(
+                (int(start), int(stop), i))
+
+        for chromosome, values in intervals.items():
+            values.sort()
+            starts = array('l', (v[0] for v in values))
+            stops = array('l', (v[1] for v in values))
+            ids = array('L', (v[2] for v in values))
+
+            max_stops = array('l', stops)
+            for j in range(1, len(max_stops)):
+                if max_stops[j] < max_stops[j - 1]:
+                    max_stops[j] = max_stops[j - 1]
+
+            self._chromosomes[chromosome] = (starts, stops, max_stops, ids)
+
+    def _lookup(self, chromosome, start, stop, exact):
+        chromosome = str(chromosome).replace('chr', '')
+        if chromosome not in self._chromosomes:
+            return []
+
+        starts, stops, max_stops, ids = self._chromosomes[chromosome]
+        if exact:
+            lo = bisect.bisect_left(starts, start)
+            hi = bisect.bisect_right(starts, start)
+            matches = [ids[i] for i in range(lo, hi) if stops[i] == stop]
+        else:
+            # Only intervals starting before the end of the range, and
+            # after the first interval that reaches the range can overlap.
+            lo = bisect.bisect_left(max_stops, start)
+            hi = bisect.bisect_right(starts, stop)
+            matches = [ids[i] for i in range(lo, hi) if stops[i] >= start]
+
+        return [self.records[i] for i in matches]
+
+    def range(self, chromosome, start, stop, exact=False):
+        """
+        Returns the records in the range, sorted by start position.
+        """
+        return self._lookup(chromosome, int(start), int(stop), exact)
+
+    def position(self, chromosome, position, exact=False):
+        """
+        Returns the records at the position, sorted by start position.
+        """
+        return self._lookup(chromosome, int(position), int(position), exact)
+
+    def __len__(self):
+        return sum(len(v[0]) for v in self._chromosomes.values())
+
+    def __repr__(self):
+        return '<GenomicIndex ({0} intervals on {1} chromosomes)>'.format(
+            len(self), len(self._chromosomes))
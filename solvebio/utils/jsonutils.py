@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+def json_default(obj):
+    """
+    Fallback of json.dumps() for read-only mappings (i.e. CompactRecord
+    query results), which are serialized as JSON objects.
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError('Object of type {0} is not JSON serializable'
+                    .format(obj.__class__.__name__))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import os
+import json
+import mmap
+import struct
+import tempfile
+from array import array
+
+from .jsonutils import json_default
+
+try:
+    array('Q')
+    OFFSET_TYPECODE = 'Q'
+except ValueError:
+    # Python 2 does not support unsigned long long arrays
+    OFFSET_TYPECODE = 'L'
+
+
+class RecordFile(object):
+    """
+    An append-only local file of records, used to store query results
+    so that they can be iterated over repeatedly (and randomly accessed)
+    without fetching them again or keeping them all in memory.
+
+    Each record is stored as JSON prefixed by its length. Only the
+    record offsets are kept in memory, the file itself is memory-mapped
+    for reading.
+
+    If no path is provided, a temporary file is used and it is removed
+    when the RecordFile is closed. Opening an existing path indexes
+    the records it already contains.
+    """
+    HEADER = struct.Struct('>I')
+
+    def __init__(self, path=None, result_class=dict):
+        self._temporary = path is None
+        if self._temporary:
+            fd, path = tempfile.mkstemp(prefix='solvebio-', suffix='.records')
+            os.close(fd)
+
+        self.path = path
+        self._result_class = result_class
+        self._offsets = array(OFFSET_TYPECODE)
+        self._size = 0
+        self._mmap = None
+        self._file = open(self.path, 'ab')
+        self._index()
+
+    def _index(self):
+        """Builds the record offsets from the existing file contents"""
+        self._size = os.path.getsize(self.path)
+        mapped = self._map()
+        offset = 0
+        while offset < self._size:
+            self._offsets.append(offset)
+            length = self.HEADER.unpack_from(mapped, offset)[0]
+            offset += self.HEADER.size + length
+
+    def _map(self):
+        if self._mmap is None and self._size:
+            self._file.flush()
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _read(self, i):
+        mapped = self._map()
+        offset = self._offsets[i]
+        length = self.HEADER.unpack_from(mapped, offset)[0]
+        start = offset + self.HEADER.size
+        record = json.loads(mapped[start:start + length].decode('utf-8'))
+        if self._result_class is not dict:
+            record = self._result_class(record)
+        return record
+
+    def append(self, record):
+        data = json.dumps(record, separators=(',', ':'),
+                          default=json_default).encode('utf-8')
+        self._file.write(self.HEADER.pack(len(data)))
+        self._file.write(data)
+        self._offsets.append(self._size)
+        self._size += self.HEADER.size + len(data)
+
+        # The file must be mapped again to read the new record
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._read(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._read(i) for i in range(*key.indices(len(self)))]
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('record index out of range')
+        return self._read(key)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if not self._file.closed:
+            self._file.close()
+            if self._temporary and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def __reduce__(self):
+        # Pickled by path: the unpickled RecordFile opens (and indexes)
+        # the same file, but does not remove it when closed.
+        self._file.flush()
+        return (self.__class__, (self.path, self._result_class))
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        return '<RecordFile {0} ({1} records)>'.format(self.path, len(self))